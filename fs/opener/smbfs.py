@@ -52,6 +52,12 @@ class SMBOpener(Opener):
             name_port=params.getint('smbfs', 'name-port', fallback=137),
             direct_tcp=params.getboolean('smbfs', 'direct-tcp', fallback=False),
             domain=params.get('smbfs', 'domain', fallback=''),
+            pool_size=params.getint('smbfs', 'pool-size', fallback=4),
+            file_pool_size=params.getint('smbfs', 'file-pool-size', fallback=8),
+            idle_timeout=params.getfloat('smbfs', 'idle-timeout', fallback=60),
+            buffer_size=params.getint('smbfs', 'buffer-size', fallback=65536),
+            cache_ttl=params.getfloat('smbfs', 'cache-ttl', fallback=None),
+            cache_size=params.getint('smbfs', 'cache-size', fallback=1024),
         )
 
         try:
@@ -0,0 +1,294 @@
+# coding: utf-8
+"""Implementation of `AsyncSMBFS`, an `asyncio` front-end to `SMBFS`.
+
+Requires Python 3.5 or later.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from .smbfs import SMBFS
+
+
+__all__ = ['AsyncSMBFS', 'AsyncSMBFile']
+
+# `get_running_loop` is new in Python 3.7, but called from a coroutine,
+# `get_event_loop` returns the running loop as well
+_get_running_loop = getattr(asyncio, "get_running_loop", asyncio.get_event_loop)
+
+
+def _workers(fs):
+    """Get the number of threads needed to use every pooled connection of ``fs``.
+    """
+    pools = [getattr(fs, name, None) for name in ("_pool", "_file_pool")]
+    return sum(pool.maxsize for pool in pools if pool is not None) or 4
+
+
+class AsyncSMBFile(object):
+    """An asynchronous binary file opened with `AsyncSMBFS.openbin`.
+
+    The calls to a file are run one at a time, in the order they were
+    made, on the executor of the filesystem that opened it. Iterating
+    over the file with ``async for`` yields its lines.
+    """
+
+    def __init__(self, fs, file):  # noqa: D107
+        self._fs = fs
+        self._file = file
+        self._lock = asyncio.Lock()
+
+    def __repr__(self):
+        return "AsyncSMBFile({!r})".format(self._file)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        line = await self.readline()
+        if not line:
+            raise StopAsyncIteration
+        return line
+
+    async def _run(self, function, *args):
+        async def call():
+            async with self._lock:
+                return await self._fs._call(function, *args)
+
+        return await self._fs._track(call())
+
+    @property
+    def closed(self):
+        """`bool`: whether the file is closed.
+        """
+        return self._file.closed
+
+    def tell(self):
+        """Get the current position in the file.
+        """
+        return self._file.tell()
+
+    async def read(self, size=-1):
+        """Read at most ``size`` bytes, or until the end of the file.
+        """
+        return await self._run(self._file.read, size)
+
+    async def readline(self, size=-1):
+        """Read a line, or at most ``size`` bytes of it.
+        """
+        return await self._run(self._file.readline, size)
+
+    async def readinto(self, buffer):
+        """Read bytes into a writable buffer.
+        """
+        return await self._run(self._file.readinto, buffer)
+
+    async def write(self, data):
+        """Write ``data`` at the current position.
+        """
+        return await self._run(self._file.write, data)
+
+    async def seek(self, offset, whence=0):
+        """Change the current position in the file.
+        """
+        return await self._run(self._file.seek, offset, whence)
+
+    async def truncate(self, size=None):
+        """Resize the file to ``size`` bytes, or to the current position.
+        """
+        return await self._run(self._file.truncate, size)
+
+    async def flush(self):
+        """Write the buffered data to the server.
+        """
+        return await self._run(self._file.flush)
+
+    async def close(self):
+        """Close the file, writing the buffered data first.
+        """
+        if not self._file.closed:
+            await self._run(self._file.close)
+
+
+class AsyncSMBFS(object):
+    """An `asyncio` front-end to an `SMBFS`.
+
+    pysmb only offers blocking calls, so the operations are run on a
+    single executor with as many threads as the filesystem has pooled
+    connections, instead of a thread for every pending operation. Any
+    number of operations can be awaited at the same time from the same
+    event loop: they wait for a free thread in the executor, like they
+    would for a free connection in the pool. Closing the filesystem waits
+    for the pending operations, including the ones of its open files.
+
+    Arguments:
+        fs (SMBFS): the filesystem to run the operations on.
+        workers (int, optional): the number of operations run at the
+            same time. Defaults to the number of connections kept by
+            the pools of ``fs``.
+
+    Example:
+        >>> async with await AsyncSMBFS.connect("server") as afs:
+        ...     data = await afs.readbytes("/share/file.txt")
+
+    """
+
+    def __init__(self, fs, workers=None):  # noqa: D107
+        self.fs = fs
+        self._executor = ThreadPoolExecutor(max_workers=workers or _workers(fs))
+        self._pending = set()
+
+    def __repr__(self):
+        return "AsyncSMBFS({!r})".format(self.fs)
+
+    @classmethod
+    async def connect(cls, *args, workers=None, **kwargs):
+        """Connect to a server without blocking the event loop.
+
+        The arguments are the ones of `SMBFS`.
+        """
+        loop = _get_running_loop()
+        fs = await loop.run_in_executor(None, functools.partial(SMBFS, *args, **kwargs))
+        return cls(fs, workers=workers)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _call(self, function, *args, **kwargs):
+        """Run a blocking call on the executor and wait for its result.
+        """
+        loop = _get_running_loop()
+        call = functools.partial(function, *args, **kwargs)
+        return await loop.run_in_executor(self._executor, call)
+
+    def _track(self, coroutine):
+        """Run ``coroutine`` as a task that `close` waits for.
+        """
+        task = asyncio.ensure_future(coroutine)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return task
+
+    async def _run(self, function, *args, **kwargs):
+        """Run a blocking call on the executor, as a pending operation.
+        """
+        return await self._track(self._call(function, *args, **kwargs))
+
+    async def close(self):
+        """Close the filesystem and its connections.
+
+        The operations awaited or scheduled before are completed first.
+        """
+        # let the tasks scheduled before start their operations
+        await asyncio.sleep(0)
+        while self._pending:
+            await asyncio.wait(list(self._pending))
+        if not self.fs.isclosed():
+            await self._call(self.fs.close)
+        self._executor.shutdown(wait=False)
+
+    async def getinfo(self, path, namespaces=None):
+        """Get information about a resource, see `fs.base.FS.getinfo`.
+        """
+        return await self._run(self.fs.getinfo, path, namespaces)
+
+    async def exists(self, path):
+        """Check if a path maps to a resource.
+        """
+        return await self._run(self.fs.exists, path)
+
+    async def isdir(self, path):
+        """Check if a path maps to an existing directory.
+        """
+        return await self._run(self.fs.isdir, path)
+
+    async def isfile(self, path):
+        """Check if a path maps to an existing file.
+        """
+        return await self._run(self.fs.isfile, path)
+
+    async def listdir(self, path):
+        """Get a list of the resource names in a directory.
+        """
+        return await self._run(self.fs.listdir, path)
+
+    async def scandir(self, path, namespaces=None, page=None):
+        """Get a list of the `~fs.info.Info` of the resources in a directory.
+
+        Unlike `fs.base.FS.scandir`, the whole directory is listed before
+        returning.
+        """
+        return await self._run(lambda: list(self.fs.scandir(path, namespaces, page)))
+
+    async def makedir(self, path, permissions=None, recreate=False):
+        """Make a directory, see `fs.base.FS.makedir`.
+        """
+        await self._run(self.fs.makedir, path, permissions, recreate)
+
+    async def makedirs(self, path, permissions=None, recreate=False):
+        """Make a directory and its missing parents, see `fs.base.FS.makedirs`.
+        """
+        await self._run(self.fs.makedirs, path, permissions, recreate)
+
+    async def remove(self, path):
+        """Remove a file.
+        """
+        await self._run(self.fs.remove, path)
+
+    async def removedir(self, path):
+        """Remove an empty directory.
+        """
+        await self._run(self.fs.removedir, path)
+
+    async def removetree(self, dir_path):
+        """Recursively remove a directory and all its contents.
+        """
+        await self._run(self.fs.removetree, dir_path)
+
+    async def copy(self, src_path, dst_path, overwrite=False, preserve_time=False):
+        """Copy a file, see `fs.base.FS.copy`.
+        """
+        await self._run(self.fs.copy, src_path, dst_path, overwrite, preserve_time)
+
+    async def move(self, src_path, dst_path, overwrite=False, preserve_time=False):
+        """Move a file, see `fs.base.FS.move`.
+        """
+        await self._run(self.fs.move, src_path, dst_path, overwrite, preserve_time)
+
+    async def readbytes(self, path):
+        """Get the contents of a file as bytes.
+        """
+        return await self._run(self.fs.readbytes, path)
+
+    async def writebytes(self, path, contents):
+        """Set the contents of a file to some bytes.
+        """
+        await self._run(self.fs.writebytes, path, contents)
+
+    async def download(self, path, file, chunk_size=None, **options):
+        """Copy a file to a blocking file-like object, see `SMBFS.download`.
+        """
+        await self._run(self.fs.download, path, file, chunk_size, **options)
+
+    async def upload(self, path, file, chunk_size=None, **options):
+        """Set a file to the contents of a blocking file-like, see `SMBFS.upload`.
+        """
+        await self._run(self.fs.upload, path, file, chunk_size, **options)
+
+    async def openbin(self, path, mode="r", buffering=-1, **options):
+        """Open a binary file, see `SMBFS.openbin`.
+
+        Returns:
+            AsyncSMBFile: the opened file.
+
+        """
+        file = await self._run(self.fs.openbin, path, mode, buffering, **options)
+        return AsyncSMBFile(self, file)
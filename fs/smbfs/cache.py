@@ -0,0 +1,169 @@
+# coding: utf-8
+"""Implementation of `InfoCache`.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import threading
+import time
+
+
+__all__ = ['InfoCache', 'MISSING']
+
+
+#: The value returned by `InfoCache.get` for paths not in the cache.
+MISSING = object()
+
+
+class InfoCache(object):
+    """A thread-safe cache of resource metadata with a time-to-live.
+
+    Entries are keyed by path, without case sensitivity since SMB servers
+    are not case sensitive either. A value of `None` is a negative entry,
+    recording that a resource does not exist. When the cache is full, the
+    least recently used entry is evicted.
+
+    Every invalidation is numbered with a *generation*, so that a lookup
+    racing with a modification does not cache a stale value: the lookup
+    records the `~InfoCache.generation` of its path when it starts, and
+    passes it to `~InfoCache.put`, which drops the value if the path was
+    invalidated in the meantime. Generations are tracked even when the
+    cache is disabled.
+
+    Arguments:
+        ttl (float, optional): the number of seconds an entry stays valid,
+            or `None` to disable the cache entirely.
+        maxsize (int): the maximum number of entries of the cache.
+
+    Attributes:
+        hits (int): the number of lookups answered by the cache.
+        misses (int): the number of lookups not answered by the cache,
+            while it is enabled.
+
+    """
+
+    def __init__(self, ttl=None, maxsize=1024):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self._ttl = ttl
+        self._maxsize = maxsize
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # the generations of the last invalidation of each path and of the
+        # tree below it, the older ones being forgotten into `_floor`
+        self._generation = 0
+        self._floor = 0
+        self._invalidations = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(path):
+        return path.strip('/').lower()
+
+    @property
+    def enabled(self):
+        """`bool`: whether the cache stores anything at all.
+        """
+        return self._ttl is not None
+
+    def get(self, path):
+        """Get the cached value for ``path``, or `MISSING`.
+        """
+        if self._ttl is None:
+            return MISSING
+        key = self._key(path)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or entry[0] < time.time():
+                self.misses += 1
+                return MISSING
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[1]
+
+    def _generation_of(self, key):
+        """Get the generation of the last invalidation of ``key``, locked.
+        """
+        generation = max(self._invalidations.get(key, (self._floor,)))
+        parts = key.split('/') if key else []
+        for i in range(len(parts)):
+            ancestor = '/'.join(parts[:i])
+            entry = self._invalidations.get(ancestor)
+            if entry is not None:
+                generation = max(generation, entry[1])
+        return max(generation, self._floor)
+
+    def generation(self, path=None):
+        """Get the generation of the last invalidation affecting ``path``.
+
+        Arguments:
+            path (str, optional): the path of a resource, or `None` to get
+                the generation of the last invalidation of any path.
+
+        Returns:
+            int: a number that only increases, and that changes every time
+            ``path`` is invalidated, directly or recursively.
+
+        """
+        with self._lock:
+            if path is None:
+                return self._generation
+            return self._generation_of(self._key(path))
+
+    def put(self, path, value, generation=None):
+        """Cache ``value`` for ``path``, `None` meaning it does not exist.
+
+        Arguments:
+            path (str): the path of the resource.
+            value (object): the value to cache.
+            generation (int, optional): the `~InfoCache.generation` when
+                ``value`` was looked up. The value is not cached if ``path``
+                was invalidated since.
+
+        """
+        if self._ttl is None:
+            return
+        key = self._key(path)
+        with self._lock:
+            if generation is not None and self._generation_of(key) > generation:
+                return
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + self._ttl, value)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, path, recursive=False):
+        """Remove ``path`` from the cache.
+
+        Arguments:
+            path (str): the path of the resource to forget.
+            recursive (bool): set to `True` to remove the entries of all
+                the resources below ``path`` as well.
+
+        """
+        key = self._key(path)
+        with self._lock:
+            self._generation += 1
+            tree = self._invalidations.pop(key, (0, 0))[1]
+            if recursive:
+                tree = self._generation
+            self._invalidations[key] = (self._generation, tree)
+            while len(self._invalidations) > self._maxsize:
+                _, forgotten = self._invalidations.popitem(last=False)
+                self._floor = max(self._floor, *forgotten)
+            self._entries.pop(key, None)
+            if recursive:
+                prefix = key + '/' if key else ''
+                for other in [k for k in self._entries if k.startswith(prefix)]:
+                    del self._entries[other]
+
+    def clear(self):
+        """Remove all entries from the cache.
+        """
+        with self._lock:
+            self._generation += 1
+            self._floor = self._generation
+            self._invalidations.clear()
+            self._entries.clear()
@@ -0,0 +1,440 @@
+# coding: utf-8
+"""Implementation of `SMBConnection`.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import struct
+import time
+
+import smb.SMBConnection
+from smb.base import NotConnectedError, _PendingRequest
+from smb.smb2_constants import SMB2_INFO_FILE, SMB2_OPLOCK_LEVEL_NONE
+from smb.smb2_structs import (
+    SMB2CloseRequest,
+    SMB2CreateRequest,
+    SMB2IoctlRequest,
+    SMB2IoctlResponse,
+    SMB2Message,
+    SMB2QueryInfoRequest,
+    SMB2ReadRequest,
+    SMB2SetInfoRequest,
+    SMB2TreeConnectRequest,
+    SMB2WriteRequest,
+)
+from smb.smb_constants import (
+    DELETE,
+    FILE_NON_DIRECTORY_FILE,
+    FILE_OPEN,
+    FILE_READ_ATTRIBUTES,
+    FILE_SHARE_DELETE,
+    FILE_SHARE_READ,
+    FILE_SHARE_WRITE,
+    SEC_IMPERSONATE,
+    SYNCHRONIZE,
+)
+from smb.smb_structs import OperationFailure
+
+
+__all__ = ['SMBConnection', 'FileHandle']
+
+#: [MS-ERREF]: STATUS_INVALID_PARAMETER
+STATUS_INVALID_PARAMETER = 0xC000000D
+
+#: [MS-ERREF]: STATUS_INVALID_DEVICE_REQUEST
+STATUS_INVALID_DEVICE_REQUEST = 0xC0000010
+
+#: [MS-ERREF]: STATUS_END_OF_FILE
+STATUS_END_OF_FILE = 0xC0000011
+
+#: [MS-ERREF]: STATUS_NO_SUCH_FILE
+STATUS_NO_SUCH_FILE = 0xC000000F
+
+#: [MS-ERREF]: STATUS_OBJECT_NAME_NOT_FOUND
+STATUS_OBJECT_NAME_NOT_FOUND = 0xC0000034
+
+#: [MS-ERREF]: STATUS_OBJECT_NAME_COLLISION
+STATUS_OBJECT_NAME_COLLISION = 0xC0000035
+
+#: [MS-ERREF]: STATUS_OBJECT_PATH_NOT_FOUND
+STATUS_OBJECT_PATH_NOT_FOUND = 0xC000003A
+
+#: [MS-ERREF]: STATUS_FILE_IS_A_DIRECTORY
+STATUS_FILE_IS_A_DIRECTORY = 0xC00000BA
+
+#: [MS-ERREF]: STATUS_NOT_SUPPORTED
+STATUS_NOT_SUPPORTED = 0xC00000BB
+
+#: [MS-ERREF]: STATUS_NOT_A_DIRECTORY
+STATUS_NOT_A_DIRECTORY = 0xC0000103
+
+
+#: [MS-FSCC] 2.3.55: FSCTL_SRV_REQUEST_RESUME_KEY
+FSCTL_SRV_REQUEST_RESUME_KEY = 0x00140078
+
+#: [MS-FSCC] 2.3.52: FSCTL_SRV_COPYCHUNK_WRITE
+FSCTL_SRV_COPYCHUNK_WRITE = 0x001480F2
+
+#: [MS-SMB2] 2.2.31: SMB2_0_IOCTL_IS_FSCTL
+SMB2_0_IOCTL_IS_FSCTL = 0x00000001
+
+#: The chunk count, chunk size and total size limits of a server-side copy
+#: request that servers accept by default ([MS-SMB2] 3.3.3).
+COPYCHUNK_LIMITS = (16, 1024 * 1024, 16 * 1024 * 1024)
+
+
+#: A handle to a file opened on the server with `SMBConnection.openFile`.
+FileHandle = collections.namedtuple(
+    'FileHandle', ['service_name', 'path', 'tid', 'fid', 'file_size']
+)
+
+
+def failure_status(failure):
+    """Get the NT status of the reply that caused an `OperationFailure`.
+
+    Returns:
+        int: the status code, or `None` if the failure carries no reply.
+
+    """
+    messages = failure.smb_messages
+    status = getattr(messages[-1], 'status', None) if messages else None
+    # SMB1 messages wrap the status in an `smb.smb_structs.SMBError`
+    return getattr(status, 'internal_value', status)
+
+
+def _ioctl_output(reply):
+    """Get the output buffer of an SMB2 IOCTL reply, even a failed one.
+    """
+    start = SMB2Message.HEADER_SIZE
+    header = reply.raw_data[start:start + SMB2IoctlResponse.STRUCTURE_SIZE]
+    if len(header) < SMB2IoctlResponse.STRUCTURE_SIZE:
+        return b''
+    fields = struct.unpack(SMB2IoctlResponse.STRUCTURE_FORMAT, header)
+    offset, length = fields[6], fields[7]
+    return reply.raw_data[offset:offset + length]
+
+
+def _normalize(path):
+    """Convert a path to the backslash-separated form used by SMB2.
+    """
+    return path.replace('/', '\\').strip('\\')
+
+
+class SMBConnection(smb.SMBConnection.SMBConnection):
+    """An `smb.SMBConnection.SMBConnection` with handle-based file access.
+
+    The methods added by this class keep a file opened on the server for
+    as long as needed, instead of opening and closing it for every single
+    operation. They are only available over SMB2: check the `isUsingSMB2`
+    property before using them.
+    """
+
+    def _sendRequest(self, message, timeout=30):
+        """Send an SMB2 message and block until the server replies.
+
+        Returns:
+            smb.smb2_structs.SMB2Message: the reply of the server, which
+            may have a non-zero status.
+
+        """
+        if not self.sock:
+            raise NotConnectedError('Not connected to server')
+
+        results = []
+
+        def cb(reply, **kwargs):
+            self.is_busy = False
+            results.append(reply)
+
+        def eb(failure):
+            self.is_busy = False
+            raise failure
+
+        self.is_busy = True
+        try:
+            self._sendSMBMessage(message)
+            self.pending_requests[message.mid] = _PendingRequest(
+                message.mid, time.time() + timeout, cb, eb
+            )
+            while self.is_busy:
+                self._pollForNetBIOSPacket(timeout)
+        finally:
+            self.is_busy = False
+
+        return results[0]
+
+    def _connectTree(self, service_name, timeout=30):
+        """Return the tree id of a share, connecting to it if needed.
+        """
+        if service_name not in self.connected_trees:
+            m = SMB2Message(SMB2TreeConnectRequest(
+                r'\\%s\%s' % (self.remote_name.upper(), service_name)
+            ))
+            reply = self._sendRequest(m, timeout)
+            if reply.status != 0:
+                raise OperationFailure(
+                    'Failed to connect to %s: Unable to connect to shared device'
+                    % service_name,
+                    [m, reply],
+                )
+            self.connected_trees[service_name] = reply.tid
+        return self.connected_trees[service_name]
+
+    def openFile(
+        self,
+        service_name,
+        path,
+        access_mask,
+        create_disp,
+        timeout=30,
+        create_options=FILE_NON_DIRECTORY_FILE,
+    ):
+        """Open a file on the server and return a handle to it.
+
+        :param string/unicode service_name: the name of the shared folder for the *path*
+        :param string/unicode path: path of the file relative to the *service_name*.
+        :param integer access_mask: the access rights requested for the handle.
+        :param integer create_disp: what to do if the file exists or does not.
+        :param integer create_options: the options of the open, which only
+                       accepts files by default.
+        :return: a `FileHandle` to use with the other handle-based methods.
+        """
+        tid = self._connectTree(service_name, timeout)
+        m = SMB2Message(SMB2CreateRequest(
+            _normalize(path),
+            file_attributes=0,
+            access_mask=access_mask,
+            share_access=FILE_SHARE_READ | FILE_SHARE_WRITE | FILE_SHARE_DELETE,
+            oplock=SMB2_OPLOCK_LEVEL_NONE,
+            impersonation=SEC_IMPERSONATE,
+            create_options=create_options,
+            create_disp=create_disp,
+        ))
+        m.tid = tid
+        reply = self._sendRequest(m, timeout)
+        if reply.status != 0:
+            raise OperationFailure(
+                'Failed to open %s on %s: Unable to open file' % (path, service_name),
+                [m, reply],
+            )
+        return FileHandle(
+            service_name, path, tid, reply.payload.fid, reply.payload.file_size
+        )
+
+    def closeFile(self, handle, timeout=30):
+        """Close a handle obtained with `openFile`.
+        """
+        m = SMB2Message(SMB2CloseRequest(handle.fid))
+        m.tid = handle.tid
+        reply = self._sendRequest(m, timeout)
+        if reply.status != 0:
+            raise OperationFailure(
+                'Failed to close %s on %s' % (handle.path, handle.service_name),
+                [m, reply],
+            )
+
+    def readFile(self, handle, offset, length, timeout=30):
+        """Read at most *length* bytes from *offset* in an opened file.
+
+        :return: the bytes read, which are shorter than *length* only
+                 if the end of the file was reached.
+        """
+        chunks = []
+        while length > 0:
+            size = min(self.max_read_size, length)
+            m = SMB2Message(SMB2ReadRequest(handle.fid, offset, size))
+            m.tid = handle.tid
+            reply = self._sendRequest(m, timeout)
+            if reply.status == STATUS_END_OF_FILE:
+                break
+            elif reply.status != 0:
+                raise OperationFailure(
+                    'Failed to read %s on %s: Read failed'
+                    % (handle.path, handle.service_name),
+                    [m, reply],
+                )
+            data = reply.payload.data
+            if not data:
+                break
+            chunks.append(data)
+            offset += len(data)
+            length -= len(data)
+        return b''.join(chunks)
+
+    def writeFile(self, handle, offset, data, timeout=30):
+        """Write *data* at *offset* in an opened file.
+
+        :return: the number of bytes written.
+        """
+        view = memoryview(data)
+        written = 0
+        while written < len(view):
+            chunk = view[written:written + self.max_write_size].tobytes()
+            m = SMB2Message(SMB2WriteRequest(handle.fid, chunk, offset + written))
+            m.tid = handle.tid
+            reply = self._sendRequest(m, timeout)
+            if reply.status != 0:
+                raise OperationFailure(
+                    'Failed to write %s on %s: Write failed'
+                    % (handle.path, handle.service_name),
+                    [m, reply],
+                )
+            written += reply.payload.count
+        return written
+
+    def queryFileSize(self, handle, timeout=30):
+        """Get the current size of an opened file.
+        """
+        m = SMB2Message(SMB2QueryInfoRequest(
+            handle.fid,
+            flags=0,
+            additional_info=0,
+            info_type=SMB2_INFO_FILE,
+            file_info_class=0x05,  # FileStandardInformation [MS-FSCC] 2.4
+            input_buf=b'',
+            output_buf_len=4096,
+        ))
+        m.tid = handle.tid
+        reply = self._sendRequest(m, timeout)
+        if reply.status != 0:
+            raise OperationFailure(
+                'Failed to query %s on %s: Unable to retrieve information on file'
+                % (handle.path, handle.service_name),
+                [m, reply],
+            )
+        return struct.unpack('<Q', reply.payload.data[8:16])[0]
+
+    def setEndOfFile(self, handle, size, timeout=30):
+        """Truncate or extend an opened file to *size* bytes on the server.
+
+        Extending the file fills the new bytes with zeros.
+        """
+        m = SMB2Message(SMB2SetInfoRequest(
+            handle.fid,
+            additional_info=0,
+            info_type=SMB2_INFO_FILE,
+            file_info_class=0x14,  # FileEndOfFileInformation [MS-FSCC] 2.4
+            data=struct.pack('<q', size),
+        ))
+        m.tid = handle.tid
+        reply = self._sendRequest(m, timeout)
+        if reply.status != 0:
+            raise OperationFailure(
+                'Failed to truncate %s on %s' % (handle.path, handle.service_name),
+                [m, reply],
+            )
+
+    def renamePath(
+        self,
+        service_name,
+        old_path,
+        new_path,
+        replace=False,
+        create_options=0,
+        timeout=30,
+    ):
+        """Rename a file or a directory on the server, in a single operation.
+
+        Unlike `rename`, an existing *new_path* can be replaced atomically,
+        instead of being removed beforehand.
+
+        :param bool replace: replace *new_path* if it exists, otherwise the
+                    rename fails with ``STATUS_OBJECT_NAME_COLLISION``.
+        :param integer create_options: the options *old_path* is opened with,
+                       e.g. ``FILE_DIRECTORY_FILE`` to only rename a directory.
+        """
+        handle = self.openFile(
+            service_name,
+            old_path,
+            DELETE | FILE_READ_ATTRIBUTES | SYNCHRONIZE,
+            FILE_OPEN,
+            timeout,
+            create_options=create_options,
+        )
+        try:
+            name = _normalize(new_path).encode('UTF-16LE')
+            m = SMB2Message(SMB2SetInfoRequest(
+                handle.fid,
+                additional_info=0,
+                info_type=SMB2_INFO_FILE,
+                file_info_class=0x0A,  # FileRenameInformation [MS-FSCC] 2.4
+                data=struct.pack('<B7xQI', bool(replace), 0, len(name)) + name,
+            ))
+            m.tid = handle.tid
+            reply = self._sendRequest(m, timeout)
+            if reply.status != 0:
+                raise OperationFailure(
+                    'Failed to rename %s on %s: Unable to rename file'
+                    % (old_path, service_name),
+                    [m, reply],
+                )
+        finally:
+            self.closeFile(handle, timeout)
+
+    def _ioctl(self, handle, ctlcode, in_data, max_out_size, timeout):
+        """Send a file system control code on an opened file.
+
+        Returns:
+            tuple: the request and the reply messages.
+
+        """
+        m = SMB2Message(SMB2IoctlRequest(
+            handle.fid, ctlcode, SMB2_0_IOCTL_IS_FSCTL, in_data, max_out_size
+        ))
+        m.tid = handle.tid
+        return m, self._sendRequest(m, timeout)
+
+    def requestResumeKey(self, handle, timeout=30):
+        """Get the key identifying an opened file as a server-side copy source.
+        """
+        m, reply = self._ioctl(handle, FSCTL_SRV_REQUEST_RESUME_KEY, b'', 32, timeout)
+        if reply.status != 0:
+            raise OperationFailure(
+                'Failed to request a resume key for %s on %s'
+                % (handle.path, handle.service_name),
+                [m, reply],
+            )
+        return _ioctl_output(reply)[:24]
+
+    def copyFile(self, source, target, length, timeout=30):
+        """Copy the first *length* bytes of an opened file to another, on the server.
+
+        The data is copied with ``FSCTL_SRV_COPYCHUNK_WRITE`` requests
+        and never goes through the client. Both files must be opened
+        through this connection, *target* with write access.
+
+        :return: the number of bytes copied, which is shorter than *length*
+                 only if *source* is.
+        """
+        key = self.requestResumeKey(source, timeout)
+        max_chunks, max_chunk_size, max_total = COPYCHUNK_LIMITS
+        offset = 0
+        while offset < length:
+            end = min(length, offset + max_total)
+            chunks = [
+                (start, min(max_chunk_size, end - start))
+                for start in range(offset, end, max_chunk_size)
+            ][:max_chunks]
+            data = key + struct.pack('<II', len(chunks), 0) + b''.join(
+                struct.pack('<QQII', start, start, size, 0) for start, size in chunks
+            )
+            m, reply = self._ioctl(target, FSCTL_SRV_COPYCHUNK_WRITE, data, 12, timeout)
+            output = _ioctl_output(reply)
+            if reply.status == STATUS_INVALID_PARAMETER and len(output) >= 12:
+                # the server replied with the limits the request exceeded
+                limits = struct.unpack('<III', output[:12])
+                if limits != (max_chunks, max_chunk_size, max_total) and all(limits):
+                    max_chunks, max_chunk_size, max_total = limits
+                    continue
+            if reply.status != 0:
+                raise OperationFailure(
+                    'Failed to copy %s on %s: Server-side copy failed'
+                    % (target.path, target.service_name),
+                    [m, reply],
+                )
+            written = struct.unpack('<III', output[:12])[2]
+            if not written:
+                break
+            offset += written
+        return offset
@@ -0,0 +1,195 @@
+# coding: utf-8
+"""Implementation of concurrent directory copies.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from ..copy import copy_file_internal
+from ..errors import BulkCopyFailed
+from ..opener import manage_fs
+from ..path import abspath, combine, frombase, normpath
+from .walk import SMBWalker
+
+
+__all__ = ['CopyStats', 'copy_dir', 'copy_fs']
+
+
+class CopyStats(object):
+    """The progress of a copy made with `copy_dir`.
+
+    Attributes:
+        directories (int): the number of directories created.
+        files (int): the number of files copied.
+        bytes (int): the size of the files copied, in bytes.
+        total_files (int): the number of files to copy.
+        total_bytes (int): the size of the files to copy, in bytes.
+
+    """
+
+    def __init__(self):
+        self.directories = 0
+        self.files = 0
+        self.bytes = 0
+        self.total_files = 0
+        self.total_bytes = 0
+        self._started = time.time()
+        self._finished = None
+
+    def __repr__(self):
+        return "CopyStats(files={}/{}, bytes={}/{}, throughput={:.0f})".format(
+            self.files, self.total_files, self.bytes, self.total_bytes, self.throughput
+        )
+
+    @property
+    def elapsed(self):
+        """`float`: the number of seconds spent copying so far.
+        """
+        return (self._finished or time.time()) - self._started
+
+    @property
+    def throughput(self):
+        """`float`: the average number of bytes copied per second.
+        """
+        elapsed = self.elapsed
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+
+def copy_dir(
+    src_fs,
+    src_path,
+    dst_fs,
+    dst_path,
+    walker=None,
+    on_copy=None,
+    on_progress=None,
+    workers=4,
+    preserve_time=False,
+):
+    """Copy a directory from one filesystem to another concurrently.
+
+    The source tree is walked with several directories listed at once,
+    then the directories are created one level at a time, with all the
+    directories of a level created concurrently, and finally the files
+    are copied by ``workers`` threads. Unlike `fs.copy.copy_dir`, no
+    filesystem lock is held, so that the threads of an `SMBFS` run over
+    distinct pooled connections.
+
+    Arguments:
+        src_fs (FS or str): Source filesystem (instance or URL).
+        src_path (str): Path to a directory on the source filesystem.
+        dst_fs (FS or str): Destination filesystem (instance or URL).
+        dst_path (str): Path to a directory on the destination filesystem.
+        walker (~fs.walk.Walker, optional): A walker object used to scan
+            for files in ``src_fs``. Defaults to an `SMBWalker` listing
+            ``workers`` directories at the same time.
+        on_copy (callable, optional): A function called after each file
+            is copied, with the ``(src_fs, src_path, dst_fs, dst_path)``
+            signature of `fs.copy.copy_dir`.
+        on_progress (callable, optional): A function called with the
+            `CopyStats` of the copy after each file is copied.
+        workers (int): The number of files copied at the same time.
+            **[default: 4]**
+        preserve_time (bool): If `True`, try to preserve mtime of the
+            resources (defaults to `False`).
+
+    Returns:
+        CopyStats: the statistics of the copy.
+
+    Raises:
+        fs.errors.BulkCopyFailed: if some of the files could not be
+            copied. The other files are still copied.
+
+    """
+    workers = max(workers, 1)
+    walker = walker or SMBWalker(workers=workers)
+    _src_path = abspath(normpath(src_path))
+    _dst_path = abspath(normpath(dst_path))
+    stats = CopyStats()
+
+    def destination(path):
+        return combine(_dst_path, frombase(_src_path, path))
+
+    with manage_fs(src_fs, writeable=False) as _src_fs, manage_fs(
+        dst_fs, create=True
+    ) as _dst_fs:
+        # list the whole tree first to report progress against totals
+        levels = collections.defaultdict(list)
+        files = []
+        for path, info in walker.info(_src_fs, _src_path, namespaces=["details"]):
+            if info.is_dir:
+                levels[path.count("/")].append(destination(path))
+            else:
+                files.append((path, info.size))
+        stats.total_files = len(files)
+        stats.total_bytes = sum(size for _, size in files)
+
+        def makedir(path):
+            _dst_fs.makedir(path, recreate=True)
+
+        def copy_file(path):
+            copy_file_internal(
+                _src_fs, path, _dst_fs, destination(path), preserve_time=preserve_time
+            )
+
+        _dst_fs.makedir(_dst_path, recreate=True)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for depth in sorted(levels):
+                for _ in executor.map(makedir, levels[depth]):
+                    stats.directories += 1
+
+            errors = []
+            futures = {
+                executor.submit(copy_file, path): (path, size) for path, size in files
+            }
+            for future in as_completed(futures):
+                path, size = futures[future]
+                try:
+                    future.result()
+                except Exception as error:
+                    errors.append(error)
+                    continue
+                stats.files += 1
+                stats.bytes += size
+                if on_copy is not None:
+                    on_copy(_src_fs, path, _dst_fs, destination(path))
+                if on_progress is not None:
+                    on_progress(stats)
+
+    stats._finished = time.time()
+    if errors:
+        raise BulkCopyFailed(errors)
+    return stats
+
+
+def copy_fs(
+    src_fs,
+    dst_fs,
+    walker=None,
+    on_copy=None,
+    on_progress=None,
+    workers=4,
+    preserve_time=False,
+):
+    """Copy the contents of one filesystem to another concurrently.
+
+    See `copy_dir` for the meaning of the arguments.
+
+    Returns:
+        CopyStats: the statistics of the copy.
+
+    """
+    return copy_dir(
+        src_fs,
+        "/",
+        dst_fs,
+        "/",
+        walker=walker,
+        on_copy=on_copy,
+        on_progress=on_progress,
+        workers=workers,
+        preserve_time=preserve_time,
+    )
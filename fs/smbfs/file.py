@@ -7,14 +7,30 @@ from __future__ import unicode_literals
 import io
 
 import smb.smb_structs
+from smb.smb_constants import (
+    FILE_APPEND_DATA,
+    FILE_CREATE,
+    FILE_OPEN,
+    FILE_OPEN_IF,
+    FILE_OVERWRITE_IF,
+    FILE_READ_ATTRIBUTES,
+    FILE_READ_DATA,
+    FILE_WRITE_ATTRIBUTES,
+    FILE_WRITE_DATA,
+    SYNCHRONIZE,
+)
 
 from .. import errors
 from ..path import join
 from ..enums import Seek
+from .connection import STATUS_OBJECT_NAME_COLLISION, failure_status
 
 
 __all__ = ['SMBFile']
 
+#: The size the read-ahead buffer may grow to on sequential reads.
+MAX_READAHEAD = 1024 * 1024
+
 
 class _Cursor(object):
     """A file-like wrapper for binary buffers.
@@ -37,9 +53,21 @@ class _Cursor(object):
 
 class SMBFile(io.RawIOBase):
     """A file on an SMB server.
+
+    Over SMB2, the file is opened once on the server when the `SMBFile` is
+    created, and all reads and writes are then issued against that handle
+    until the file is closed. Over SMB1, each operation opens and closes
+    the remote file.
+
+    Reads go through a read-ahead buffer, which starts at the size given
+    by ``buffering`` and doubles on every sequential refill, so that
+    `~SMBFile.readline` and line iteration do not cost a round trip to the
+    server for every line. Consecutive writes are coalesced in a buffer of
+    the same size, which is written to the server when full, and whenever
+    the file is flushed, seeked, read, truncated or closed.
     """
 
-    def __init__(self, smb_fs, share, smb_path, mode):
+    def __init__(self, smb_fs, share, smb_path, mode, buffering=-1):
         """Create an `SMBFile` instance.
 
         Arguments:
@@ -47,40 +75,192 @@ class SMBFile(io.RawIOBase):
             share (str): the name of the share this file is located on.
             smb_path (str): the path to the resource on the share.
             mode (fs.mode.Mode): the mode the file is opened with.
+            buffering (int): the size of the write buffer and the initial
+                size of the read-ahead buffer, ``0`` to disable buffering,
+                or ``-1`` to use the ``buffer_size`` of ``smb_fs``.
 
         """
         self._fs = smb_fs
         self._mode = mode
         self._share = share
         self._smb_path = smb_path
-        self._position = self._size() if mode.appending else 0
+        self._smb = None
+        self._handle = None
+        self._position = 0
+
+        if buffering in (-1, 1):
+            buffering = smb_fs._buffer_size
+        self._buffer_size = buffering
+        self._readahead_min = buffering
+        self._readahead_max = max(buffering, MAX_READAHEAD) if buffering else 0
+        self._readahead = self._readahead_min
+        self._buffer = b''
+        self._buffer_offset = 0
+        self._wbuffer = bytearray()
+        self._wbuffer_offset = 0
 
         try:
-            self._smb = smb_fs._new_connection()
+            self._smb = smb_fs._file_pool.acquire()
         except (IOError, OSError):
             raise errors.OperationFailed("could not create new connection")
 
         try:
-            if mode.truncate:
-                self.truncate(0)
-            elif mode.writing:
-                self.write(b'')
-            if mode.reading:
-                self.read(0)
+            if self._smb.isUsingSMB2:
+                # `Mode('x').truncate` is true as well
+                if mode.exclusive:
+                    self._open(FILE_CREATE)
+                elif mode.truncate:
+                    self._open(FILE_OVERWRITE_IF)
+                elif mode.create:
+                    self._open(FILE_OPEN_IF)
+                else:
+                    self._open(FILE_OPEN)
+                if mode.appending:
+                    self._position = self._handle.file_size
+            else:
+                self._position = self._size() if mode.appending else 0
+                if mode.truncate:
+                    self.truncate(0)
+                elif mode.writing:
+                    self._write_at(self._position, b'')
+                if mode.reading:
+                    self._read_at(0, 0)
         except smb.smb_structs.OperationFailure as exc:
+            self.close()
+            if failure_status(exc) == STATUS_OBJECT_NAME_COLLISION:
+                raise errors.FileExists('/'.join([share, smb_path]), exc=exc)
             raise errors.PermissionDenied('/'.join([share, smb_path]), exc=exc)
 
+    def _open(self, create_disp):
+        """Open a handle to the remote file with the given disposition.
+        """
+        access_mask = FILE_READ_DATA | FILE_READ_ATTRIBUTES | SYNCHRONIZE
+        if self._mode.writing:
+            access_mask |= FILE_WRITE_DATA | FILE_APPEND_DATA | FILE_WRITE_ATTRIBUTES
+        self._handle = self._smb.openFile(
+            self._share, self._smb_path, access_mask, create_disp,
+            timeout=self._fs._timeout,
+        )
+
     def _size(self):
         """Return the number of bytes in the file.
         """
+        if self._handle is not None:
+            return self._smb.queryFileSize(self._handle, timeout=self._fs._timeout)
         try:
             return self._fs.getsize(join(self._share, self._smb_path))
         except errors.ResourceNotFound:
             return 0
 
+    def _read_at(self, offset, size):
+        """Read at most ``size`` bytes from the file, starting at ``offset``.
+        """
+        if self._handle is not None:
+            if size < 0:
+                size = max(self._size() - offset, 0)
+            return self._smb.readFile(
+                self._handle, offset, size, timeout=self._fs._timeout
+            )
+        handle = io.BytesIO()
+        self._smb.retrieveFileFromOffset(
+            service_name=self._share, path=self._smb_path, file_obj=handle,
+            offset=offset, max_length=size, timeout=self._fs._timeout,
+        )
+        return handle.getvalue()
+
+    def _write_at(self, offset, data):
+        """Write ``data`` to the file at ``offset``.
+        """
+        if self._handle is not None:
+            return self._smb.writeFile(
+                self._handle, offset, data, timeout=self._fs._timeout
+            )
+        new_position = self._smb.storeFileFromOffset(
+            service_name=self._share, path=self._smb_path,
+            file_obj=io.BytesIO(data), offset=offset, truncate=False,
+            timeout=self._fs._timeout
+        )
+        return new_position - offset
+
+    def _buffered(self, size=-1):
+        """Return at most ``size`` read-ahead bytes at the current position.
+        """
+        start = self._position - self._buffer_offset
+        if not 0 <= start < len(self._buffer):
+            return b''
+        end = len(self._buffer) if size < 0 else start + size
+        return self._buffer[start:end]
+
+    def _fill(self, offset):
+        """Refill the read-ahead buffer with the bytes at ``offset``.
+
+        The read-ahead size doubles when the refill starts where the
+        previous buffer ended, and is reset otherwise.
+        """
+        if self._buffer and offset == self._buffer_offset + len(self._buffer):
+            self._readahead = min(self._readahead * 2, self._readahead_max)
+        else:
+            self._readahead = self._readahead_min
+        self._buffer = self._read_at(offset, self._readahead)
+        self._buffer_offset = offset
+        return self._buffer
+
+    def _read(self, size):
+        """Read at most ``size`` bytes at the current position.
+        """
+        if size is None or size < 0:
+            data = self._buffered()
+            data += self._read_at(self._position + len(data), -1)
+            self._buffer = b''
+            return data
+        data = self._buffered(size)
+        if len(data) < size:
+            offset = self._position + len(data)
+            if size - len(data) >= self._readahead:
+                data += self._read_at(offset, size - len(data))
+            else:
+                data += self._fill(offset)[:size - len(data)]
+        return data
+
+    def _flush_writes(self):
+        """Write the pending buffered writes to the server.
+        """
+        if self._wbuffer:
+            self._write_at(self._wbuffer_offset, self._wbuffer)
+            self._wbuffer = bytearray()
+
+    def _check_readable(self):
+        """Check the file can be read, and flush the pending writes.
+        """
+        if not self._mode.reading:
+            raise IOError('File not open for reading')
+        self._flush_writes()
+
     def close(self):
-        super(SMBFile, self).close()
-        self._smb.close()
+        try:
+            # `IOBase.close` flushes the pending writes
+            super(SMBFile, self).close()
+        finally:
+            if self._mode.writing:
+                self._fs._invalidate(join(self._share, self._smb_path))
+            self._buffer = b''
+            self._wbuffer = bytearray()
+            if self._smb is not None:
+                smb_con, self._smb = self._smb, None
+                try:
+                    if self._handle is not None:
+                        smb_con.closeFile(self._handle, timeout=self._fs._timeout)
+                        self._handle = None
+                except Exception:
+                    self._fs._file_pool.release(smb_con, discard=True)
+                    raise
+                else:
+                    self._fs._file_pool.release(smb_con)
+
+    def flush(self):  # noqa: D102
+        super(SMBFile, self).flush()
+        if self._smb is not None:
+            self._flush_writes()
 
     @property
     def mode(self):
@@ -90,24 +270,67 @@ class SMBFile(io.RawIOBase):
         return self._mode.reading
 
     def read(self, size=-1):  # noqa: D102
-        if not self._mode.reading:
-            raise IOError('File not open for reading')
-        handle = io.BytesIO()
-        _, bytes_read = self._smb.retrieveFileFromOffset(
-            service_name=self._share, path=self._smb_path, file_obj=handle,
-            offset=self._position, max_length=size, timeout=self._fs._timeout,
-        )
-        self._position += bytes_read
-        return handle.getvalue()
+        self._check_readable()
+        data = self._read(size)
+        self._position += len(data)
+        return data
+
+    def read1(self, size=-1):  # noqa: D102
+        self._check_readable()
+        data = self._buffered(size)
+        if not data and size != 0:
+            data = self._read(self._readahead if size is None or size < 0 else size)
+        self._position += len(data)
+        return data
+
+    def peek(self, size=0):  # noqa: D102
+        self._check_readable()
+        data = self._buffered()
+        if not data and self._readahead:
+            self._fill(self._position)
+            data = self._buffered()
+        return data[:max(size, io.DEFAULT_BUFFER_SIZE)]
+
+    def readline(self, size=-1):  # noqa: D102
+        self._check_readable()
+        if not self._readahead:
+            return super(SMBFile, self).readline(size)
+        if size is None:
+            size = -1
+        chunks = []
+        while size != 0:
+            start = self._position - self._buffer_offset
+            if not 0 <= start < len(self._buffer):
+                if not self._fill(self._position):
+                    break
+                start = 0
+            end = len(self._buffer)
+            if size >= 0:
+                end = min(end, start + size)
+            newline = self._buffer.find(b'\n', start, end)
+            if newline >= 0:
+                end = newline + 1
+            chunks.append(self._buffer[start:end])
+            self._position += end - start
+            size -= 0 if size < 0 else end - start
+            if newline >= 0:
+                break
+        return b''.join(chunks)
 
     def readinto(self, buffer):  # noqa: D102
-        if not self._mode.reading:
-            raise IOError('File not open for reading')
-        handle = _Cursor(buffer)
-        _, bytes_read = self._smb.retrieveFileFromOffset(
-            service_name=self._share, path=self._smb_path, file_obj=handle,
-            offset=self._position, max_length=len(buffer), timeout=self._fs._timeout,
-        )
+        self._check_readable()
+        buffered = self._buffered()
+        if self._handle is not None or buffered or len(buffer) < self._readahead:
+            data = self._read(len(buffer))
+            bytes_read = len(data)
+            buffer[:bytes_read] = data
+        else:
+            handle = _Cursor(buffer)
+            _, bytes_read = self._smb.retrieveFileFromOffset(
+                service_name=self._share, path=self._smb_path, file_obj=handle,
+                offset=self._position, max_length=len(buffer),
+                timeout=self._fs._timeout,
+            )
         self._position += bytes_read
         return bytes_read
 
@@ -118,6 +341,7 @@ class SMBFile(io.RawIOBase):
         return self._position
 
     def seek(self, offset, whence=Seek.set):  # noqa: D102
+        self._flush_writes()
         if whence == Seek.set:
             if offset < 0:
                 raise ValueError("Negative seek position {}".format(offset))
@@ -142,19 +366,33 @@ class SMBFile(io.RawIOBase):
     def write(self, data):  # noqa: D102
         if not self._mode.writing:
             raise IOError('File not open for writing')
-        new_position = self._smb.storeFileFromOffset(
-            service_name=self._share, path=self._smb_path,
-            file_obj=io.BytesIO(data), offset=self._position, truncate=False,
-            timeout=self._fs._timeout
-        )
-        written_bytes = new_position - self._position
-        self._position = new_position
+        self._buffer = b''
+        wbuffer_end = self._wbuffer_offset + len(self._wbuffer)
+        if self._wbuffer and self._position != wbuffer_end:
+            self._flush_writes()
+        if not self._wbuffer and len(data) >= self._buffer_size:
+            written_bytes = self._write_at(self._position, data)
+        else:
+            if not self._wbuffer:
+                self._wbuffer_offset = self._position
+            written_bytes = -len(self._wbuffer)
+            self._wbuffer += data
+            written_bytes += len(self._wbuffer)
+            if len(self._wbuffer) >= self._buffer_size:
+                self._flush_writes()
+        self._position += written_bytes
         return written_bytes
 
     def truncate(self, pos=None):  # noqa: D102
+        self._flush_writes()
         pos = pos if pos is not None else self._position
-        size = self._size()
+        self._buffer = b''
+
+        if self._handle is not None:
+            self._smb.setEndOfFile(self._handle, pos, timeout=self._fs._timeout)
+            return pos
 
+        size = self._size()
         self.seek(0)
 
         if not pos:
@@ -167,6 +405,7 @@ class SMBFile(io.RawIOBase):
         # FIXME: instead of reading everything up to `pos`,
         #        create an IO wrapper that looks like its
         #        EOF is at `pos`
+        self._buffer = b''
         return self._smb.storeFileFromOffset(
             service_name=self._share, path=self._smb_path,
             file_obj=handle, offset=0, truncate=True,
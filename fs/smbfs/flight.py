@@ -0,0 +1,83 @@
+# coding: utf-8
+"""Implementation of `SingleFlight`.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import sys
+import threading
+
+import six
+
+
+__all__ = ['SingleFlight']
+
+
+class _Call(object):
+    """A call in flight, waited upon by the duplicate calls.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exc_info = None
+
+
+class SingleFlight(object):
+    """Coalesce concurrent identical calls into a single one.
+
+    When a thread calls `SingleFlight.do` with a key while another call
+    with the same key is still running, it waits for that call to finish
+    and gets its result (or exception) instead of running the function
+    again. Results are shared between threads, so they must not be
+    mutated by the callers.
+
+    Attributes:
+        calls (int): the number of functions actually called.
+        coalesced (int): the number of calls that waited for a duplicate
+            call in flight instead.
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, function):
+        """Call ``function`` unless a call with the same ``key`` is running.
+
+        Arguments:
+            key (hashable): the key identifying identical calls.
+            function (callable): the function to call, without arguments.
+
+        Returns:
+            object: the value returned by ``function``, in this thread or
+            in the thread whose call was in flight.
+
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                call.result = function()
+            except BaseException:
+                call.exc_info = sys.exc_info()
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.exc_info is not None:
+            six.reraise(*call.exc_info)
+        return call.result
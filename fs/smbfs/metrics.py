@@ -0,0 +1,328 @@
+# coding: utf-8
+"""Implementation of `Metrics`, the instrumentation of SMB calls.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import bisect
+import collections
+import contextlib
+import threading
+import timeit
+
+import six
+
+
+__all__ = ['BUCKETS', 'CallEvent', 'CallStats', 'Metrics']
+
+
+#: The upper bounds of the buckets of the latency histograms, in seconds.
+BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+#: The name of the events recording a wait on the filesystem lock.
+LOCK = "lock"
+
+#: The connection methods recorded by `Metrics`, which all send requests.
+CALLS = frozenset([
+    'connect',
+    'echo',
+    'listShares',
+    'listPath',
+    'listSnapshots',
+    'getAttributes',
+    'getSecurity',
+    'retrieveFile',
+    'retrieveFileFromOffset',
+    'storeFile',
+    'storeFileFromOffset',
+    'deleteFiles',
+    'resetFileAttributes',
+    'createDirectory',
+    'deleteDirectory',
+    'rename',
+    'openFile',
+    'closeFile',
+    'readFile',
+    'writeFile',
+    'queryFileSize',
+    'setEndOfFile',
+    'renamePath',
+    'requestResumeKey',
+    'copyFile',
+])
+
+#: An event passed to the callbacks of `Metrics` after each recorded call.
+CallEvent = collections.namedtuple(
+    'CallEvent', ['name', 'elapsed', 'error', 'bytes_in', 'bytes_out']
+)
+
+
+def _transferred(name, args, kwargs, result):
+    """Get the number of bytes received and sent by a successful call.
+    """
+    bytes_in = bytes_out = 0
+    try:
+        if name in ('retrieveFile', 'retrieveFileFromOffset'):
+            bytes_in = result[1]
+        elif name == 'readFile':
+            bytes_in = len(result)
+        elif name in ('storeFile', 'writeFile'):
+            bytes_out = result
+        elif name == 'storeFileFromOffset':
+            # the result is the offset of the end of the written data
+            bytes_out = result - kwargs.get('offset', args[3] if len(args) > 3 else 0)
+    except (TypeError, IndexError):
+        pass
+    # ignore the results of unexpected types, e.g. of mocked calls
+    if not isinstance(bytes_in, six.integer_types):
+        bytes_in = 0
+    if not isinstance(bytes_out, six.integer_types):
+        bytes_out = 0
+    return bytes_in, bytes_out
+
+
+class CallStats(object):
+    """The statistics of the calls of a single kind.
+
+    Attributes:
+        count (int): the number of calls.
+        errors (int): the number of calls that raised an exception.
+        total_time (float): the time spent in the calls, in seconds.
+        bytes_in (int): the number of bytes received by the calls.
+        bytes_out (int): the number of bytes sent by the calls.
+        buckets (list): the number of calls that took at most each of the
+            durations in ``bounds``, then the number of longer calls.
+        bounds (tuple): the upper bounds of the buckets, in seconds.
+
+    """
+
+    def __init__(self, bounds=BUCKETS):  # noqa: D107
+        self.count = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+
+    def __repr__(self):
+        return "CallStats(count={}, errors={}, mean={:.6f})".format(
+            self.count, self.errors, self.mean
+        )
+
+    @property
+    def mean(self):
+        """`float`: the average duration of a call, in seconds.
+        """
+        return self.total_time / self.count if self.count else 0.0
+
+    def observe(self, elapsed, error=False, bytes_in=0, bytes_out=0):
+        """Add a call to the statistics.
+        """
+        self.count += 1
+        self.errors += bool(error)
+        self.total_time += elapsed
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+        self.buckets[bisect.bisect_left(self.bounds, elapsed)] += 1
+
+    def copy(self):
+        """Get a copy of the statistics.
+        """
+        stats = CallStats(self.bounds)
+        stats.__dict__.update(self.__dict__, buckets=list(self.buckets))
+        return stats
+
+
+class Metrics(object):
+    """Counters and latency histograms of the SMB calls of a filesystem.
+
+    Every call made through the connections of an `SMBFS`, including the
+    ones of the files it opened, is recorded under the name of the method
+    called (e.g. ``getAttributes`` or ``retrieveFileFromOffset``), and
+    the time spent waiting for the filesystem lock is recorded under
+    ``lock``. A single instance can be shared by several filesystems.
+
+    Arguments:
+        bounds (tuple): the upper bounds of the buckets of the latency
+            histograms, in seconds. **[default: 1ms to 10s]**
+        callbacks (list): functions called with a `CallEvent` after each
+            recorded call, e.g. to forward it to a monitoring system. They
+            are called in the thread that made the call, and must not
+            raise.
+
+    Example:
+        >>> with smb_fs.metrics.capture() as events:
+        ...     smb_fs.move('/share/a', '/share/b')
+        >>> [event.name for event in events]
+        ['renamePath']
+
+    """
+
+    def __init__(self, bounds=BUCKETS, callbacks=()):  # noqa: D107
+        self._bounds = tuple(bounds)
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._callbacks = list(callbacks)
+
+    def __repr__(self):
+        return "Metrics({!r})".format(self.snapshot())
+
+    def add_callback(self, callback):
+        """Call ``callback`` with a `CallEvent` after each recorded call.
+        """
+        with self._lock:
+            self._callbacks = self._callbacks + [callback]
+
+    def remove_callback(self, callback):
+        """Stop calling a callback added with `add_callback`.
+        """
+        with self._lock:
+            callbacks = list(self._callbacks)
+            callbacks.remove(callback)
+            self._callbacks = callbacks
+
+    @contextlib.contextmanager
+    def capture(self):
+        """Collect the events recorded during a ``with`` block.
+
+        The events of all the threads are collected, including the ones
+        of calls unrelated to the code in the block.
+
+        Yields:
+            list: the `CallEvent` recorded so far, in order.
+
+        """
+        events = []
+        self.add_callback(events.append)
+        try:
+            yield events
+        finally:
+            self.remove_callback(events.append)
+
+    def record(self, name, elapsed, error=False, bytes_in=0, bytes_out=0):
+        """Record a call that took ``elapsed`` seconds.
+        """
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = CallStats(self._bounds)
+            stats.observe(elapsed, error, bytes_in, bytes_out)
+            callbacks = self._callbacks
+        if callbacks:
+            event = CallEvent(name, elapsed, bool(error), bytes_in, bytes_out)
+            for callback in callbacks:
+                callback(event)
+
+    def call(self, name, function, *args, **kwargs):
+        """Call ``function`` and record the call under ``name``.
+        """
+        start = timeit.default_timer()
+        try:
+            result = function(*args, **kwargs)
+        except BaseException:
+            self.record(name, timeit.default_timer() - start, True)
+            raise
+        bytes_in, bytes_out = _transferred(name, args, kwargs, result)
+        self.record(name, timeit.default_timer() - start, False, bytes_in, bytes_out)
+        return result
+
+    def snapshot(self):
+        """Get a copy of the statistics recorded so far.
+
+        Returns:
+            dict: the `CallStats` of each kind of call, by name.
+
+        """
+        with self._lock:
+            return {name: stats.copy() for name, stats in self._stats.items()}
+
+    def reset(self):
+        """Forget the statistics recorded so far.
+        """
+        with self._lock:
+            self._stats.clear()
+
+    @property
+    def bytes_in(self):
+        """`int`: the number of bytes of file contents received.
+        """
+        with self._lock:
+            return sum(stats.bytes_in for stats in self._stats.values())
+
+    @property
+    def bytes_out(self):
+        """`int`: the number of bytes of file contents sent.
+        """
+        with self._lock:
+            return sum(stats.bytes_out for stats in self._stats.values())
+
+    @property
+    def requests(self):
+        """`int`: the number of calls to the server recorded so far.
+        """
+        with self._lock:
+            return sum(
+                stats.count for name, stats in self._stats.items() if name != LOCK
+            )
+
+
+class InstrumentedConnection(object):
+    """A proxy to a connection recording its calls in a `Metrics`.
+    """
+
+    def __init__(self, con, metrics):  # noqa: D107
+        self._con = con
+        self._metrics = metrics
+
+    def __repr__(self):
+        return repr(self._con)
+
+    def __getattr__(self, name):
+        attr = getattr(self._con, name)
+        if name not in CALLS:
+            return attr
+
+        def call(*args, **kwargs):
+            return self._metrics.call(name, attr, *args, **kwargs)
+
+        return call
+
+    def __setattr__(self, name, value):
+        # attributes are set on the connection, which may use them itself
+        if name in ('_con', '_metrics'):
+            super(InstrumentedConnection, self).__setattr__(name, value)
+        else:
+            setattr(self._con, name, value)
+
+    def __delattr__(self, name):
+        delattr(self._con, name)
+
+
+class InstrumentedLock(object):
+    """A proxy to a lock recording the time spent acquiring it in a `Metrics`.
+    """
+
+    def __init__(self, lock, metrics):  # noqa: D107
+        self._lock = lock
+        self._metrics = metrics
+
+    def acquire(self, *args, **kwargs):
+        """Acquire the lock, see `threading.RLock.acquire`.
+        """
+        start = timeit.default_timer()
+        acquired = self._lock.acquire(*args, **kwargs)
+        self._metrics.record(LOCK, timeit.default_timer() - start, not acquired)
+        return acquired
+
+    def release(self):
+        """Release the lock.
+        """
+        self._lock.release()
+
+    __enter__ = acquire
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
@@ -0,0 +1,160 @@
+# coding: utf-8
+"""Implementation of `ConnectionPool`.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import contextlib
+import socket
+import threading
+import time
+
+import smb.base
+import smb.smb_structs
+
+
+__all__ = ['ConnectionPool']
+
+
+#: The exceptions after which a connection should not be reused.
+_BROKEN = (
+    IOError,
+    OSError,
+    socket.error,
+    smb.base.NotConnectedError,
+    smb.base.SMBTimeout,
+    smb.smb_structs.ProtocolError,
+)
+
+
+class ConnectionPool(object):
+    """A thread-safe, bounded pool of SMB connections.
+
+    Connections are created lazily using ``factory``, and reused in a
+    last-in first-out order so that a single-threaded user keeps talking
+    to the server through the same connection.
+
+    Arguments:
+        factory (callable): a callable returning a new connected and
+            authenticated `smb.SMBConnection.SMBConnection`.
+        maxsize (int): the maximum number of connections of the pool.
+        block (bool): if `True`, at most ``maxsize`` connections are opened
+            at the same time, and threads requesting a connection while
+            the pool is exhausted block until one is released. If `False`,
+            new connections are always created on demand, but at most
+            ``maxsize`` of them are kept open once released.
+        idle_timeout (float, optional): the number of seconds after which
+            an unused connection is closed, or `None` to keep idle
+            connections open until the pool is closed.
+
+    """
+
+    def __init__(self, factory, maxsize=4, block=True, idle_timeout=None):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self._factory = factory
+        self._maxsize = maxsize
+        self._block = block
+        self._idle_timeout = idle_timeout
+        self._idle = []
+        self._created = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+
+    @property
+    def maxsize(self):
+        """`int`: the maximum number of connections of the pool.
+        """
+        return self._maxsize
+
+    def _evict(self):
+        """Remove the connections idle for too long, with the lock held.
+        """
+        expired = []
+        if self._idle_timeout is not None:
+            deadline = time.time() - self._idle_timeout
+            while self._idle and self._idle[0][1] < deadline:
+                expired.append(self._idle.pop(0)[0])
+            self._created -= len(expired)
+        return expired
+
+    def acquire(self):
+        """Check out a connection, creating a new one if needed.
+        """
+        expired = []
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise smb.base.NotConnectedError("connection pool is closed")
+                expired.extend(self._evict())
+                if self._idle:
+                    con = self._idle.pop()[0]
+                    break
+                if not self._block or self._created < self._maxsize:
+                    self._created += 1
+                    con = None
+                    break
+                self._cond.wait()
+        for old in expired:
+            old.close()
+        if con is not None:
+            return con
+        try:
+            return self._factory()
+        except BaseException:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, con, discard=False):
+        """Return a connection to the pool.
+
+        Arguments:
+            con (smb.SMBConnection.SMBConnection): a connection obtained
+                with `ConnectionPool.acquire`.
+            discard (bool): set to `True` to close the connection instead
+                of making it available again, e.g. after a network error.
+
+        """
+        with self._cond:
+            expired = self._evict()
+            discard = discard or self._closed or len(self._idle) >= self._maxsize
+            if discard:
+                self._created -= 1
+            else:
+                self._idle.append((con, time.time()))
+            self._cond.notify()
+        for old in expired:
+            old.close()
+        if discard:
+            con.close()
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Check out a connection for the duration of a ``with`` block.
+
+        Connections that raised a network error are discarded.
+        """
+        con = self.acquire()
+        try:
+            yield con
+        except _BROKEN:
+            self.release(con, discard=True)
+            raise
+        except BaseException:
+            self.release(con)
+            raise
+        else:
+            self.release(con)
+
+    def close(self):
+        """Close all idle connections and stop handing out new ones.
+        """
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+            self._cond.notify_all()
+        for con, _ in idle:
+            con.close()
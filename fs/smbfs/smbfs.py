@@ -4,26 +4,49 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import collections
 import io
 import itertools
 import socket
+from concurrent.futures import ThreadPoolExecutor
 
 import nmb.NetBIOS
 import six
-import smb.SMBConnection
+import smb.base
+import smb.smb2_constants
 import smb.smb_constants
+import smb.smb_structs
 import smb.security_descriptors
 
 from .. import errors
 from ..base import FS
+from ..copy import copy_modified_time
 from ..info import Info
 from ..mode import Mode
-from ..path import join, dirname
+from ..path import join, dirname, isbase
 from ..enums import ResourceType
 from ..permissions import Permissions
 
-from . import utils
+from . import transfer, utils
+from .cache import InfoCache, MISSING
+from .copy import copy_dir
+from .flight import SingleFlight
+from .connection import (
+    SMBConnection,
+    STATUS_FILE_IS_A_DIRECTORY,
+    STATUS_INVALID_DEVICE_REQUEST,
+    STATUS_NO_SUCH_FILE,
+    STATUS_NOT_A_DIRECTORY,
+    STATUS_OBJECT_NAME_COLLISION,
+    STATUS_OBJECT_NAME_NOT_FOUND,
+    STATUS_OBJECT_PATH_NOT_FOUND,
+    STATUS_NOT_SUPPORTED,
+    failure_status,
+)
 from .file import SMBFile
+from .metrics import InstrumentedConnection, InstrumentedLock, Metrics
+from .pool import ConnectionPool
+from .walk import SMBBoundGlobber, SMBWalker
 
 if six.PY2:
     casefold = unicode.lower
@@ -34,6 +57,39 @@ else:
 __all__ = ["SMBFS"]
 
 
+#: The attribute mask of `listPath` matching every resource.
+_SEARCH_ALL = (
+    smb.smb_constants.SMB_FILE_ATTRIBUTE_READONLY
+    | smb.smb_constants.SMB_FILE_ATTRIBUTE_HIDDEN
+    | smb.smb_constants.SMB_FILE_ATTRIBUTE_SYSTEM
+    | smb.smb_constants.SMB_FILE_ATTRIBUTE_DIRECTORY
+    | smb.smb_constants.SMB_FILE_ATTRIBUTE_ARCHIVE
+    | smb.smb_constants.SMB_FILE_ATTRIBUTE_INCL_NORMAL
+)
+
+#: The access rights of the handles of a server-side copy.
+_COPY_SOURCE_ACCESS = (
+    smb.smb_constants.FILE_READ_DATA
+    | smb.smb_constants.FILE_READ_ATTRIBUTES
+    | smb.smb_constants.SYNCHRONIZE
+)
+_COPY_TARGET_ACCESS = (
+    smb.smb_constants.FILE_WRITE_DATA
+    | smb.smb_constants.FILE_WRITE_ATTRIBUTES
+    | smb.smb_constants.SYNCHRONIZE
+)
+
+#: The statuses of a failed server-side copy meaning it is not supported.
+_NO_SERVER_COPY = (STATUS_INVALID_DEVICE_REQUEST, STATUS_NOT_SUPPORTED)
+
+#: The statuses of a failed listing meaning the directory does not exist.
+_NOT_FOUND = (
+    STATUS_NO_SUCH_FILE,
+    STATUS_OBJECT_NAME_NOT_FOUND,
+    STATUS_OBJECT_PATH_NOT_FOUND,
+)
+
+
 class SMBFS(FS):
     """A filesystem over SMB.
 
@@ -55,6 +111,30 @@ class SMBFS(FS):
             server using TCP instead of NetBIOS. **[default: False]**
         domain (str): the network domain to connect with, the workgroup on
             windows. Usually safe to leave as empty string **[default: '']**
+        pool_size (int): the maximum number of connections opened to the
+            server to run filesystem operations concurrently from several
+            threads. **[default: 4]**
+        file_pool_size (int): the maximum number of idle connections kept
+            open to be reused by files opened with `~SMBFS.openbin` and
+            by whole-file transfers, and the default number of parts
+            transferred concurrently by `~SMBFS.download` and
+            `~SMBFS.upload`. **[default: 8]**
+        idle_timeout (float): the number of seconds after which an unused
+            connection is closed. Use `None` to keep connections open until
+            the filesystem is closed. **[default: 60]**
+        buffer_size (int): the size of the read-ahead and write buffers of
+            the files opened with `~SMBFS.openbin` when no ``buffering`` is
+            given. Use ``0`` to disable buffering. **[default: 65536]**
+        cache_ttl (float, optional): the number of seconds the metadata and
+            the security descriptor of a resource are cached for, or `None`
+            to disable the metadata cache. Only changes made through this
+            instance invalidate the cache. **[default: None]**
+        cache_size (int): the maximum number of resources in the metadata
+            cache. **[default: 1024]**
+        metrics (~fs.smbfs.metrics.Metrics, optional): where to record the
+            calls to the server and the waits on the filesystem lock, e.g.
+            to share it between several filesystems. Defaults to a new
+            `Metrics`, available as the `metrics` attribute.
 
     Raises:
         `fs.errors.CreateFailed`: if the filesystem could not be created.
@@ -79,6 +159,15 @@ class SMBFS(FS):
     #: The client used to communicate with the NetBIOS naming service.
     NETBIOS = nmb.NetBIOS.NetBIOS()
 
+    #: The walker lists several directories concurrently over the pool.
+    walker_class = SMBWalker
+
+    @property
+    def glob(self):
+        """`~fs.smbfs.walk.SMBBoundGlobber`: a globber object.
+        """
+        return SMBBoundGlobber(self)
+
     @classmethod
     def _make_info_from_shared_file(cls, shared_file, sd=None, namespaces=None):
         """Translate a `smb.base.SharedFile` object to a raw info `dict`.
@@ -235,8 +324,17 @@ class SMBFS(FS):
         name_port=137,
         direct_tcp=False,
         domain="",
+        pool_size=4,
+        file_pool_size=8,
+        idle_timeout=60,
+        buffer_size=65536,
+        cache_ttl=None,
+        cache_size=1024,
+        metrics=None,
     ):  # noqa: D102
         super(SMBFS, self).__init__()
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._lock = InstrumentedLock(self._lock, self.metrics)
 
         try:
             self._server_name, self._server_ip = utils.get_hostname_and_ip(
@@ -260,19 +358,38 @@ class SMBFS(FS):
         self._password = passwd
         self._direct_tcp = direct_tcp
         self._domain = domain
+        self._buffer_size = buffer_size
+        self._cache = InfoCache(ttl=cache_ttl, maxsize=cache_size)
+        self._sd_cache = InfoCache(ttl=cache_ttl, maxsize=cache_size)
+        self._flight = SingleFlight()
+        self._server_copy = True
         self._connect_kw = dict(timeout=self._timeout)
         if self._server_port is not None:
             self._connect_kw["port"] = self._server_port
 
+        self._pool = ConnectionPool(
+            self._new_connection, maxsize=pool_size, idle_timeout=idle_timeout
+        )
+        self._file_pool = ConnectionPool(
+            self._new_connection,
+            maxsize=file_pool_size,
+            block=False,
+            idle_timeout=idle_timeout,
+        )
         try:
-            self._smb = self._new_connection()
+            con = self._pool.acquire()
         except (IOError, OSError) as exc:
             six.raise_from(
                 errors.CreateFailed("could not connect to '{}'".format(host)), exc
             )
+        else:
+            self._pool.release(con)
+        # only kept to inspect the session: the connection belongs to the pool
+        # and may be in use by another thread, so requests go through `_pool`
+        self._smb = con
 
     def _new_connection(self):
-        con = smb.SMBConnection.SMBConnection(
+        con = SMBConnection(
             self._username,
             self._password,
             self._client_name,
@@ -280,23 +397,52 @@ class SMBFS(FS):
             is_direct_tcp=self._direct_tcp,
             domain=self._domain,
         )
-        con.connect(self._server_ip, **self._connect_kw)
-        return con
+        self.metrics.call("connect", con.connect, self._server_ip, **self._connect_kw)
+        return InstrumentedConnection(con, self.metrics)
+
+    @property
+    def metadata_stats(self):
+        """`dict`: counters of the metadata requests of this filesystem.
+
+        ``requests`` counts the metadata requests sent to the server,
+        ``coalesced`` the requests answered by an identical request
+        already in flight, and ``cache_hits`` and ``cache_misses`` the
+        lookups of the metadata cache.
+        """
+        return {
+            "requests": self._flight.calls,
+            "coalesced": self._flight.coalesced,
+            "cache_hits": self._cache.hits,
+            "cache_misses": self._cache.misses,
+        }
+
+    def _invalidate(self, path, recursive=False):
+        """Drop the cached metadata of a modified resource and its parent.
+        """
+        self._cache.invalidate(path, recursive=recursive)
+        self._cache.invalidate(dirname(path))
+        self._sd_cache.invalidate(path, recursive=recursive)
 
     if six.PY2:
 
         def close(self):  # noqa: D102
             if not self.isclosed():
-                if hasattr(self, "_smb"):
-                    self._smb.close()
+                if hasattr(self, "_pool"):
+                    self._pool.close()
+                    self._file_pool.close()
+                    self._cache.clear()
+                    self._sd_cache.clear()
             super(SMBFS, self).close()
 
     else:
 
         def close(self):  # noqa: D102
             if not self.isclosed():
-                if hasattr(self, "_smb"):
-                    self._smb.close()
+                if hasattr(self, "_pool"):
+                    self._pool.close()
+                    self._file_pool.close()
+                    self._cache.clear()
+                    self._sd_cache.clear()
             super().close()
 
     def makedir(self, path, permissions=None, recreate=False):  # noqa: D102
@@ -323,8 +469,9 @@ class SMBFS(FS):
             try:
                 info = self.getinfo(_path)
             except errors.ResourceNotFound:
-                with self.lock():
-                    self._smb.createDirectory(share, smb_path, self._timeout)
+                with self._pool.connection() as con:
+                    con.createDirectory(share, smb_path, self._timeout)
+                self._invalidate(_path)
             else:
                 if not (info.is_dir and recreate):
                     raise errors.DirectoryExists(path)
@@ -338,61 +485,236 @@ class SMBFS(FS):
 
         # TODO: check for permissions before opening the file
 
-        with self.lock():
-            # check the file is not a folder if it exists
-            if self.exists(_path):
-                if not self.isfile(path):
-                    raise errors.FileExpected(path)
-                elif _mode.exclusive:
-                    raise errors.FileExists(path)
-            elif not _mode.create:
-                raise errors.ResourceNotFound(path)
-            else:
-                if not self.getinfo(dirname(_path)).is_dir:
-                    raise errors.DirectoryExpected(dirname(path))
-            # open / create a new SMBFile
-            share, smb_path = utils.split_path(_path)
-            if not smb_path:
-                raise errors.PermissionDenied("cannot open file in '/'")
-            return SMBFile(self, share, smb_path, _mode)
+        # check the file is not a folder if it exists
+        if self.exists(_path):
+            if not self.isfile(path):
+                raise errors.FileExpected(path)
+            elif _mode.exclusive:
+                raise errors.FileExists(path)
+        elif not _mode.create:
+            raise errors.ResourceNotFound(path)
+        else:
+            if not self.getinfo(dirname(_path)).is_dir:
+                raise errors.DirectoryExpected(dirname(path))
+        # open / create a new SMBFile
+        share, smb_path = utils.split_path(_path)
+        if not smb_path:
+            raise errors.PermissionDenied("cannot open file in '/'")
+        smb_file = SMBFile(self, share, smb_path, _mode, buffering)
+        if _mode.writing:
+            self._invalidate(_path)
+        return smb_file
 
     def listdir(self, path):  # noqa: D102
+        if self.validatepath(path) in "/":
+            return self._list_shares()
         return [f.name for f in self.scandir(path)]
 
-    def move(
+    def _copy_on_server(self, src_path, dst_path, size):
+        """Copy a file without sending its contents through the client.
+
+        Returns:
+            bool: `True` if the file was copied, or `False` if the server
+            does not support server-side copies, or if the files could not
+            be opened, in which case nothing was copied.
+
+        """
+        src_share, src_smb_path = utils.split_path(src_path)
+        dst_share, dst_smb_path = utils.split_path(dst_path)
+        if not (self._server_copy and src_smb_path and dst_smb_path):
+            return False
+
+        with self._file_pool.connection() as con:
+            if not con.isUsingSMB2:
+                return False
+            try:
+                source = con.openFile(
+                    src_share, src_smb_path, _COPY_SOURCE_ACCESS,
+                    smb.smb_constants.FILE_OPEN, self._timeout,
+                )
+            except smb.smb_structs.OperationFailure:
+                return False
+            try:
+                target = con.openFile(
+                    dst_share, dst_smb_path, _COPY_TARGET_ACCESS,
+                    smb.smb_constants.FILE_OVERWRITE_IF, self._timeout,
+                )
+            except smb.smb_structs.OperationFailure:
+                con.closeFile(source, self._timeout)
+                return False
+            try:
+                con.copyFile(source, target, size, self._timeout)
+            except smb.smb_structs.OperationFailure as failure:
+                if failure_status(failure) in _NO_SERVER_COPY:
+                    self._server_copy = False
+                return False
+            finally:
+                self._invalidate(dst_path)
+                con.closeFile(target, self._timeout)
+                con.closeFile(source, self._timeout)
+        return True
+
+    def copy(
         self, src_path, dst_path, overwrite=False, preserve_time=False
     ):  # noqa: D102
         _src_path = self.validatepath(src_path)
         _dst_path = self.validatepath(dst_path)
+        # unlike `FS.copy`, do not hold the filesystem lock while copying
+        if not overwrite and self.exists(_dst_path):
+            raise errors.DestinationExists(dst_path)
+        info = self.getinfo(_src_path, namespaces=["details"])
+        if not info.is_file:
+            raise errors.FileExpected(src_path)
+        # stream the file through the client if the server cannot copy it
+        if not self._copy_on_server(_src_path, _dst_path, info.size):
+            with self.openbin(_src_path) as read_file:
+                self.upload(_dst_path, read_file)
+        if preserve_time:
+            copy_modified_time(self, src_path, self, dst_path)
+
+    def copydir(
+        self, src_path, dst_path, create=False, preserve_time=False
+    ):  # noqa: D102
+        if not create and not self.exists(dst_path):
+            raise errors.ResourceNotFound(dst_path)
+        if not self.getinfo(src_path).is_dir:
+            raise errors.DirectoryExpected(src_path)
+        copy_dir(
+            self,
+            src_path,
+            self,
+            dst_path,
+            workers=self._file_pool.maxsize,
+            preserve_time=preserve_time,
+        )
 
-        _src_share, _src_smb_path = utils.split_path(_src_path)
-        _dst_share, _dst_smb_path = utils.split_path(_dst_path)
-
-        # Check the source exists and is a file
-        with self.lock():
-            if not self.getinfo(src_path).is_file:
-                raise errors.FileExpected(src_path)
-
-        # Cannot rename across shares
-        if _src_share != _dst_share:  # pragma: no cover
-            return super(SMBFS, self).move(
-                src_path, dst_path, overwrite=overwrite, preserve_time=preserve_time
-            )
+    def _check_move(self, src_path, dst_path, overwrite, directory):
+        """Raise the error explaining why a resource cannot be renamed.
 
+        Does nothing if no problem could be found.
+        """
+        info = self.getinfo(src_path)
+        if directory and not info.is_dir:
+            raise errors.DirectoryExpected(src_path)
+        elif not directory and not info.is_file:
+            raise errors.FileExpected(src_path)
         # Check the parent of dst_path exists and is not a file
         if not self.getinfo(dirname(dst_path)).is_dir:
             raise errors.DirectoryExpected(dirname(dst_path))
-        # Check the destination does not exist
+        # Check the destination does not exist, or can be replaced
         if self.exists(dst_path):
-            if overwrite:
-                self.remove(dst_path)
-            else:
+            if directory or not overwrite:
+                raise errors.DestinationExists(dst_path)
+            elif not self.isfile(dst_path):
+                raise errors.FileExpected(dst_path)
+
+    def _rename(self, src_path, dst_path, overwrite=False, directory=False):
+        """Rename a resource within a share with a single server operation.
+
+        Returns:
+            bool: `True` if the resource was renamed, or `False` if the
+            connection does not support it, in which case nothing was
+            renamed.
+
+        Raises:
+            fs.errors.DestinationExists: if ``dst_path`` exists and
+                ``overwrite`` is `False`, or if it is a directory.
+
+        """
+        share, src_smb_path = utils.split_path(src_path)
+        _, dst_smb_path = utils.split_path(dst_path)
+        if directory:
+            create_options = smb.smb_constants.FILE_DIRECTORY_FILE
+        else:
+            create_options = smb.smb_constants.FILE_NON_DIRECTORY_FILE
+
+        try:
+            with self._pool.connection() as con:
+                if not con.isUsingSMB2:
+                    return False
+                con.renamePath(
+                    share,
+                    src_smb_path,
+                    dst_smb_path,
+                    replace=overwrite and not directory,
+                    create_options=create_options,
+                    timeout=self._timeout,
+                )
+        except smb.smb_structs.OperationFailure as failure:
+            status = failure_status(failure)
+            # the last message is the reply to the request that failed
+            reply = failure.smb_messages[-1] if failure.smb_messages else None
+            command = getattr(reply, "command", None)
+            opening = command == smb.smb2_constants.SMB2_COM_CREATE
+            if status == STATUS_OBJECT_NAME_COLLISION and not overwrite:
                 raise errors.DestinationExists(dst_path)
+            elif status == STATUS_FILE_IS_A_DIRECTORY and opening:
+                raise errors.FileExpected(src_path)
+            elif status == STATUS_NOT_A_DIRECTORY and opening:
+                raise errors.DirectoryExpected(src_path)
+            elif status in _NOT_FOUND:
+                raise errors.ResourceNotFound(src_path if opening else dst_path)
+            # the status is not conclusive, check the resources themselves
+            self._check_move(src_path, dst_path, overwrite, directory)
+            raise
+        finally:
+            self._invalidate(src_path, recursive=directory)
+            self._invalidate(dst_path, recursive=directory)
+        return True
+
+    def move(
+        self, src_path, dst_path, overwrite=False, preserve_time=False
+    ):  # noqa: D102
+        _src_path = self.validatepath(src_path)
+        _dst_path = self.validatepath(dst_path)
+
+        _src_share, _src_smb_path = utils.split_path(_src_path)
+        _dst_share, _dst_smb_path = utils.split_path(_dst_path)
+
+        # Cannot rename across shares, copy and remove the file instead
+        if _src_share != _dst_share:
+            if not overwrite and self.exists(_dst_path):
+                raise errors.DestinationExists(dst_path)
+            self.copy(_src_path, _dst_path, overwrite=True, preserve_time=preserve_time)
+            self.remove(_src_path)
+            return
+
+        # Rename (and replace) in a single request when the server can
+        if _src_smb_path and _dst_smb_path:
+            if self._rename(_src_path, _dst_path, overwrite):
+                return
+
+        self._check_move(_src_path, _dst_path, overwrite, directory=False)
+        if self.exists(_dst_path):
+            self.remove(_dst_path)
         # Rename with PySMB
-        with self.lock():
-            self._smb.rename(
-                _src_share, _src_smb_path, _dst_smb_path, timeout=self._timeout
-            )
+        with self._pool.connection() as con:
+            con.rename(_src_share, _src_smb_path, _dst_smb_path, timeout=self._timeout)
+        self._invalidate(_src_path)
+        self._invalidate(_dst_path)
+
+    def movedir(
+        self, src_path, dst_path, create=False, preserve_time=False
+    ):  # noqa: D102
+        _src_path = self.validatepath(src_path)
+        _dst_path = self.validatepath(dst_path)
+
+        _src_share, _src_smb_path = utils.split_path(_src_path)
+        _dst_share, _dst_smb_path = utils.split_path(_dst_path)
+
+        # a missing destination is the directory itself renamed, otherwise
+        # the contents of the source are merged into the destination
+        if create and _src_share == _dst_share and _src_smb_path and _dst_smb_path:
+            if not isbase(_src_path, _dst_path):
+                try:
+                    if self._rename(_src_path, _dst_path, directory=True):
+                        return
+                except errors.DestinationExists:
+                    pass
+
+        return super(SMBFS, self).movedir(
+            src_path, dst_path, create=create, preserve_time=preserve_time
+        )
 
     def scandir(self, path, namespaces=None, page=None):  # noqa: D102
         _path = self.validatepath(path)
@@ -407,11 +729,94 @@ class SMBFS(FS):
         return iter_info
 
     def _get_security(self, share, path):
-        try:
-            with self.lock():
-                return self._smb.getSecurity(share, path)
-        except smb.base.NotReadyError:
-            return None
+        # the root of a share is given as either "/" or "", and must be
+        # cached under the path of the share in the filesystem
+        _path = join("/", share, path.strip("/"))
+        sd = self._sd_cache.get(_path)
+        if sd is MISSING:
+            generation = self._sd_cache.generation(_path)
+
+            def get_security():
+                try:
+                    with self._pool.connection() as con:
+                        sd = con.getSecurity(share, path)
+                except smb.base.NotReadyError:
+                    sd = None
+                self._sd_cache.put(_path, sd, generation)
+                return sd
+
+            key = ("getSecurity", _path, generation)
+            sd = self._flight.do(key, get_security)
+        return sd
+
+    def _map_concurrent(self, function, items):
+        """Iterate over the results of ``function`` applied to ``items``.
+
+        The calls are run concurrently, using up to as many threads as
+        there are connections in the pool, and the results are yielded in
+        the order of ``items``. ``function`` must not be called while
+        holding a pooled connection, or it could wait for itself.
+        """
+        if len(items) < 2:
+            for item in items:
+                yield function(item)
+            return
+        workers = min(self._pool.maxsize, len(items))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for result in executor.map(function, items):
+                yield result
+
+    def _iter_security(self, resources):
+        """Iterate over the security descriptors of several resources.
+
+        Arguments:
+            resources (list): a list of ``(share, path)`` tuples.
+
+        """
+        return self._map_concurrent(lambda r: self._get_security(*r), resources)
+
+    def _get_attributes(self, path):
+        """Get the `~smb.base.SharedFile` of a resource, or `None`.
+        """
+        shared_file = self._cache.get(path)
+        if shared_file is MISSING:
+            share, smb_path = utils.split_path(path)
+            # a lookup that started before the last modification of the
+            # resource is not joined, as it may have seen its former state
+            generation = self._cache.generation(path)
+
+            def get_attributes():
+                try:
+                    with self._pool.connection() as con:
+                        shared_file = con.getAttributes(share, smb_path)
+                except smb.smb_structs.OperationFailure:
+                    shared_file = None
+                self._cache.put(path, shared_file, generation)
+                return shared_file
+
+            key = ("getAttributes", path, generation)
+            shared_file = self._flight.do(key, get_attributes)
+        return shared_file
+
+    def _list_path(self, share, smb_path, pattern="*", search=_SEARCH_ALL):
+        """List a directory, coalescing concurrent identical listings.
+
+        Returns:
+            tuple: the `~InfoCache.generation` of the cache when the listing
+            started, and the list of `~smb.base.SharedFile` in the directory.
+
+        """
+        def list_path():
+            generation = self._cache.generation()
+            with self._pool.connection() as con:
+                listing = con.listPath(share, smb_path, search=search, pattern=pattern)
+            return generation, listing
+
+        # a listing that started before the last modification of the
+        # directory is not joined, as it may miss an entry
+        generation = self._cache.generation(join("/", share, smb_path))
+        key = ("listPath", share, smb_path, pattern, search, generation)
+        return self._flight.do(key, list_path)
 
     def _scanshares(self, namespaces=None):
         """Iterate over the shares in the root directory.
@@ -422,20 +827,24 @@ class SMBFS(FS):
                 `SMBFS._make_info_from_shared_file`. Defaults to ``basic``
                 only.
         """
-        sd = None
-        with self.lock():
-            devices = self._smb.listShares()
-        for device in devices:
-            if device.type == device.DISK_TREE:
-                if "access" in namespaces:
-                    sd = self._get_security(device.name, "/")
-                with self.lock():
-                    attr = self._smb.getAttributes(device.name, "/")
-                info = self._make_info_from_shared_file(attr, sd, namespaces)
-                info.raw["basic"]["name"] = device.name
-                yield info
-
-    def _scandir(self, path, namespaces=None):
+        def get_info(name):
+            with self._pool.connection() as con:
+                attr = con.getAttributes(name, "/")
+            sd = self._get_security(name, "/") if "access" in namespaces else None
+            info = self._make_info_from_shared_file(attr, sd, namespaces)
+            info.raw["basic"]["name"] = name
+            return info
+
+        return self._map_concurrent(get_info, self._list_shares())
+
+    def _list_shares(self):
+        """List the names of the disk shares of the server.
+        """
+        with self._pool.connection() as con:
+            devices = con.listShares()
+        return [device.name for device in devices if device.type == device.DISK_TREE]
+
+    def _scandir(self, path, namespaces=None, pattern="*", files=True, dirs=True):
         """Iterate over the resources in a directory.
 
         Arguments:
@@ -444,28 +853,113 @@ class SMBFS(FS):
                 yielded `fs.info.Info`. Supports the namespaces supported by
                 `SMBFS._make_info_from_shared_file`. Defaults to ``basic``
                 only.
+            pattern (str): a wildcard the names of the resources must match,
+                evaluated by the server. See `utils.server_pattern`.
+            files (bool): set to `False` to skip files.
+            dirs (bool): set to `False` to skip directories.
         """
-        sd = None
-        if self.isfile(path):
-            raise errors.DirectoryExpected(path)
-        elif not self.isdir(path):
+        search = _SEARCH_ALL
+        if not files:
+            search = smb.smb_constants.SMB_FILE_ATTRIBUTE_DIRECTORY
+        elif not dirs:
+            search &= ~smb.smb_constants.SMB_FILE_ATTRIBUTE_DIRECTORY
+
+        _path = self.validatepath(path)
+        share, smb_path = utils.split_path(_path)
+
+        shared_file = self._cache.get(_path)
+        if shared_file is None:
             raise errors.ResourceNotFound(path)
-        share, smb_path = utils.split_path(self.validatepath(path))
-        with self.lock():
-            shared_files = self._smb.listPath(share, smb_path)
-        for shared_file in shared_files:
-            if shared_file.filename not in "..":
-                if "access" in namespaces:
-                    sd = self._get_security(share, join(smb_path, shared_file.filename))
-                yield self._make_info_from_shared_file(shared_file, sd, namespaces)
+        elif shared_file is not MISSING and not shared_file.isDirectory:
+            raise errors.DirectoryExpected(path)
+
+        try:
+            # the entries are not cached if modified during the listing
+            generation, shared_files = self._list_path(
+                share, smb_path, pattern, search
+            )
+        except smb.smb_structs.OperationFailure as failure:
+            status = failure_status(failure)
+            if status == STATUS_NOT_A_DIRECTORY:
+                raise errors.DirectoryExpected(path)
+            elif status in _NOT_FOUND:
+                raise errors.ResourceNotFound(path)
+            # the status is not conclusive, check the resource itself
+            if self.isfile(path):
+                raise errors.DirectoryExpected(path)
+            elif not self.isdir(path):
+                raise errors.ResourceNotFound(path)
+            raise
+
+        shared_files = [
+            f for f in shared_files
+            if f.filename not in ".."
+            and (dirs if f.isDirectory else files)
+            and (pattern == "*" or self.match([pattern], f.filename))
+        ]
+        if "access" in namespaces:
+            sds = self._iter_security([
+                (share, join(smb_path, shared_file.filename))
+                for shared_file in shared_files
+            ])
+        else:
+            sds = itertools.repeat(None)
+        for shared_file, sd in six.moves.zip(shared_files, sds):
+            self._cache.put(
+                join(_path, shared_file.filename), shared_file, generation
+            )
+            yield self._make_info_from_shared_file(shared_file, sd, namespaces)
+
+    def filterdir(
+        self,
+        path,
+        files=None,
+        dirs=None,
+        exclude_dirs=None,
+        exclude_files=None,
+        namespaces=None,
+        page=None,
+    ):  # noqa: D102
+        _path = self.validatepath(path)
+        if _path in "/":
+            return super(SMBFS, self).filterdir(
+                path, files, dirs, exclude_dirs, exclude_files, namespaces, page
+            )
+
+        # let the server filter the names if all resources share a pattern,
+        # and skip the directories or the files if all of them are excluded
+        pattern = utils.server_pattern(files) if files == dirs else "*"
+        resources = self._scandir(
+            _path,
+            namespaces or (),
+            pattern=pattern,
+            files=not (exclude_files and "*" in exclude_files),
+            dirs=not (exclude_dirs and "*" in exclude_dirs),
+        )
+
+        def keep(info):
+            if info.is_dir:
+                patterns, excluded = dirs, exclude_dirs
+            else:
+                patterns, excluded = files, exclude_files
+            if patterns and not self.match(patterns, info.name):
+                return False
+            return not (excluded and self.match(excluded, info.name))
+
+        iter_info = six.moves.filter(keep, resources)
+        if page is not None:
+            start, end = page
+            iter_info = itertools.islice(iter_info, start, end)
+        return iter_info
 
     def remove(self, path):  # noqa: D102
         _path = self.validatepath(path)
         if not self.getinfo(_path).is_file:
             raise errors.FileExpected(path)
         share, smb_path = utils.split_path(_path)
-        with self.lock():
-            self._smb.deleteFiles(share, smb_path)
+        with self._pool.connection() as con:
+            con.deleteFiles(share, smb_path)
+        self._invalidate(_path)
 
     def removedir(self, path):  # noqa: D102
         _path = self.validatepath(path)
@@ -473,9 +967,7 @@ class SMBFS(FS):
         if _path in "/":
             raise errors.RemoveRootError(path)
 
-        if not self.getinfo(path).is_dir:
-            raise errors.DirectoryExpected(path)
-
+        # `scandir` raises if `path` is not an existing directory
         if next(self.scandir(path), None) is not None:
             raise errors.DirectoryNotEmpty(path)
 
@@ -483,8 +975,63 @@ class SMBFS(FS):
         if not smb_path:
             raise errors.PermissionDenied(msg="cannot remove share '{}'".format(share))
 
-        with self.lock():
-            self._smb.deleteDirectory(share, smb_path)
+        with self._pool.connection() as con:
+            con.deleteDirectory(share, smb_path)
+        self._invalidate(_path, recursive=True)
+
+    def removetree(self, dir_path):
+        """Recursively remove a directory and all its contents.
+
+        The tree is listed with an `SMBWalker`, then the files of each
+        directory are deleted with a single wildcard request, with
+        several directories processed concurrently, and finally the
+        directories are removed bottom-up, one level at a time. Unlike
+        `FS.removetree`, no resource is checked before being deleted.
+
+        Arguments:
+            dir_path (str): Path to a directory on the filesystem.
+
+        Raises:
+            fs.errors.ResourceNotFound: If ``dir_path`` does not exist.
+            fs.errors.DirectoryExpected: If ``dir_path`` is not a directory.
+            fs.errors.PermissionDenied: If ``dir_path`` is a share, after
+                its contents were removed.
+
+        """
+        _path = self.validatepath(dir_path)
+        if _path in "/":
+            return super(SMBFS, self).removetree(dir_path)
+        share, smb_path = utils.split_path(_path)
+
+        def delete_files(path):
+            pattern = join(utils.split_path(path)[1], "*")
+            with self._pool.connection() as con:
+                con.deleteFiles(share, pattern, timeout=self._timeout)
+
+        def delete_directory(path):
+            smb_path = utils.split_path(path)[1]
+            with self._pool.connection() as con:
+                con.deleteDirectory(share, smb_path, timeout=self._timeout)
+
+        levels = collections.defaultdict(list)
+        filled = []
+        try:
+            for path, _, files in SMBWalker().walk(self, _path):
+                # a share is emptied but cannot be removed
+                if path != _path or smb_path:
+                    levels[path.count("/")].append(path)
+                if files:
+                    filled.append(path)
+            for _ in self._map_concurrent(delete_files, filled):
+                pass
+            for depth in sorted(levels, reverse=True):
+                for _ in self._map_concurrent(delete_directory, levels[depth]):
+                    pass
+        finally:
+            self._invalidate(_path, recursive=True)
+
+        if not smb_path:
+            raise errors.PermissionDenied(msg="cannot remove share '{}'".format(share))
 
     def geturl(self, path, purpose="download"):  # noqa: D102
         _path = self.validatepath(path)
@@ -507,10 +1054,8 @@ class SMBFS(FS):
         if not share:
             return self._make_root_info(namespaces)
 
-        try:
-            with self.lock():
-                shared_file = self._smb.getAttributes(share, smb_path)
-        except smb.smb_structs.OperationFailure:
+        shared_file = self._get_attributes(_path)
+        if shared_file is None:
             raise errors.ResourceNotFound(path)
 
         if "access" in namespaces:
@@ -532,15 +1077,27 @@ class SMBFS(FS):
         """Copy a file from the filesystem to a file-like object.
 
         This method uses the `smb.SMBConnection.SMBConnection.retrieveFile`
-        method without creating a new connection, which should be more
+        method with a pooled connection, which should be more
         efficient than opening and reading from a file with `openbin`.
+        Files larger than ``chunk_size`` are split in parts downloaded
+        concurrently over several pooled connections. Transfers use the
+        connections of files rather than the ones of metadata operations,
+        which are not delayed by large downloads.
 
         Arguments:
             path (str): A path on the filesystem.
             file (file-like): A file-like object open for writing in
-                binary mode.
-            chunk_size (int, optional): Ignored, kept for compatibility
-                with the `fs.base.FS.upload` signature.
+                binary mode. Parts are written at their position if it
+                is a seekable file not open in append mode, and in order
+                otherwise.
+            chunk_size (int, optional): The size of the parts of the file
+                downloaded concurrently. **[default: 8MiB]**
+
+        Keyword Arguments:
+            workers (int): The number of parts downloaded at the same
+                time. Defaults to ``file_pool_size``.
+            max_buffered (int): The number of parts held in memory when
+                ``file`` is written in order. **[default: 8]**
 
         Note that the file object ``file`` will *not* be closed by this
         method. Take care to close it after this method completes
@@ -553,26 +1110,56 @@ class SMBFS(FS):
         """
         _path = self.validatepath(path)
 
-        if not self.getinfo(path).is_file:
+        info = self.getinfo(path, namespaces=["details"])
+        if not info.is_file:
             raise errors.FileExpected(path)
 
         share, smb_path = utils.split_path(_path)
-        with self.lock():
-            self._smb.retrieveFile(share, smb_path, file, timeout=self._timeout)
+        part_size = chunk_size or transfer.PART_SIZE
+        workers = options.get("workers", self._file_pool.maxsize)
+        if info.size <= part_size or workers < 2:
+            with self._file_pool.connection() as con:
+                con.retrieveFile(share, smb_path, file, timeout=self._timeout)
+        else:
+            transfer.download(
+                self._file_pool,
+                share,
+                smb_path,
+                file,
+                info.size,
+                part_size=part_size,
+                workers=workers,
+                max_buffered=options.get("max_buffered", transfer.MAX_BUFFERED),
+                timeout=self._timeout,
+            )
 
     def upload(self, path, file, chunk_size=None, **options):
         """Set a file to the contents of a binary file object.
 
         This method uses the `smb.SMBConnection.SMBConnection.storeFile`
-        method without creating a new connection, which should be more
+        method with a pooled connection, which should be more
         efficient than opening and writing to a file with `openbin`.
+        If ``file`` is seekable and larger than ``chunk_size``, it is
+        split in parts uploaded concurrently over several pooled
+        connections. If ``file`` is an `SMBFile`, e.g. when copying
+        between shares or between servers, its parts are read while the
+        previous ones are being written. Transfers use the connections of
+        files rather than the ones of metadata operations, which are not
+        delayed by large uploads.
 
         Arguments:
           path (str): A path on the filesystem.
           file (io.IOBase): A file object open for reading in
               binary mode.
-          chunk_size (int, optional): Ignored, kept for compatibility
-              with the `fs.base.FS.download` signature.
+          chunk_size (int, optional): The size of the parts of the file
+              uploaded concurrently, or 1MiB when ``file`` is an `SMBFile`.
+              **[default: 8MiB]**
+
+        Keyword Arguments:
+          workers (int): The number of parts uploaded at the same time.
+              Defaults to ``file_pool_size``.
+          max_buffered (int): The number of parts read ahead of the one
+              being written when ``file`` is an `SMBFile`. **[default: 2]**
 
         Raises:
           fs.errors.ResourceNotFound: If a parent directory of
@@ -598,8 +1185,38 @@ class SMBFS(FS):
         if not smb_path:
             raise errors.PermissionDenied("cannot open file in '/'")
 
-        with self.lock():
-            self._smb.storeFile(share, smb_path, file, timeout=self._timeout)
+        part_size = chunk_size or transfer.PART_SIZE
+        workers = options.get("workers", self._file_pool.maxsize)
+        try:
+            if isinstance(file, SMBFile):
+                # reading is as slow as writing, so overlap them instead
+                transfer.pipe(
+                    file,
+                    self._file_pool,
+                    share,
+                    smb_path,
+                    part_size=chunk_size or transfer.PIPE_SIZE,
+                    max_buffered=options.get("max_buffered", 2),
+                    timeout=self._timeout,
+                )
+                return
+            size = transfer.remaining(file) if workers > 1 else None
+            if size is None or size <= part_size:
+                with self._file_pool.connection() as con:
+                    con.storeFile(share, smb_path, file, timeout=self._timeout)
+            else:
+                transfer.upload(
+                    self._file_pool,
+                    share,
+                    smb_path,
+                    file,
+                    size,
+                    part_size=part_size,
+                    workers=workers,
+                    timeout=self._timeout,
+                )
+        finally:
+            self._invalidate(_path)
 
     def readbytes(self, path):  # noqa: D102
         buffer = io.BytesIO()
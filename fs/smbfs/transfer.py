@@ -0,0 +1,361 @@
+# coding: utf-8
+"""Implementation of whole-file transfers split in concurrent parts.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import io
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import six
+from smb.smb_constants import (
+    FILE_OVERWRITE_IF,
+    FILE_WRITE_ATTRIBUTES,
+    FILE_WRITE_DATA,
+    SYNCHRONIZE,
+)
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+__all__ = [
+    'PART_SIZE',
+    'MAX_BUFFERED',
+    'PIPE_SIZE',
+    'remaining',
+    'download',
+    'upload',
+    'pipe',
+]
+
+
+#: The default size of the parts of a file transferred concurrently.
+PART_SIZE = 8 * 1024 * 1024
+
+#: The default number of parts downloaded ahead of an unseekable target.
+MAX_BUFFERED = 8
+
+#: The default size of the parts of a file streamed by `pipe`.
+PIPE_SIZE = 1024 * 1024
+
+
+def _seekable(file):
+    """Check whether ``file`` can be accessed at any position.
+    """
+    try:
+        if not file.seekable():
+            return False
+    except AttributeError:
+        pass
+    try:
+        file.tell()
+    except (AttributeError, IOError, OSError):
+        return False
+    return True
+
+
+#: The types of the files that can be written at any position, unless they
+#: are open in append mode.
+_POSITIONAL_TYPES = (io.BytesIO, io.FileIO, io.BufferedWriter, io.BufferedRandom)
+
+
+def _positional(file):
+    """Check whether data can be written to ``file`` at any position.
+
+    Other file-like objects, and files open in append mode, which write
+    at the end whatever the position, are written sequentially.
+    """
+    if not isinstance(file, _POSITIONAL_TYPES) or not _seekable(file):
+        return False
+    if "a" in getattr(file, "mode", ""):
+        return False
+    if fcntl is not None and not isinstance(file, io.BytesIO):
+        try:
+            return not fcntl.fcntl(file.fileno(), fcntl.F_GETFL) & os.O_APPEND
+        except (AttributeError, IOError, OSError):
+            return False
+    return True
+
+
+def remaining(file):
+    """Get the number of bytes left to read in a file.
+
+    Returns:
+        int: the number of bytes between the current position and the
+        end of ``file``, or `None` if it is not seekable.
+
+    """
+    if not _seekable(file):
+        return None
+    position = file.tell()
+    try:
+        file.seek(0, io.SEEK_END)
+        return file.tell() - position
+    finally:
+        file.seek(position)
+
+
+def _ordered(function, items, workers, window):
+    """Iterate over the results of ``function`` applied to ``items``.
+
+    The calls are run by ``workers`` threads, at most ``window`` items
+    ahead of the result being consumed, and the results are yielded in
+    the order of ``items``. The calls not started yet are cancelled if
+    the iteration stops early.
+    """
+    items = iter(items)
+    executor = ThreadPoolExecutor(max_workers=min(workers, window))
+    futures = collections.deque()
+    try:
+        for item in itertools.islice(items, window):
+            futures.append(executor.submit(function, item))
+        while futures:
+            result = futures.popleft().result()
+            for item in itertools.islice(items, 1):
+                futures.append(executor.submit(function, item))
+            yield result
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+class _PositionalWriter(object):
+    """A file-like object writing at increasing offsets of a shared file.
+    """
+
+    def __init__(self, file, lock, offset):
+        self.file = file
+        self.lock = lock
+        self.offset = offset
+
+    def write(self, data):
+        with self.lock:
+            self.file.seek(self.offset)
+            self.file.write(data)
+        self.offset += len(data)
+        return len(data)
+
+
+def download(
+    pool,
+    share,
+    path,
+    file,
+    size,
+    part_size=PART_SIZE,
+    workers=4,
+    max_buffered=MAX_BUFFERED,
+    timeout=30,
+):
+    """Download a file in parts fetched concurrently over several connections.
+
+    Parts are written at their position in ``file`` as soon as they are
+    received if it is a seekable file, or an `io.BytesIO`, not open in
+    append mode. Otherwise, they are held in memory until all the previous
+    parts were written, and at most ``max_buffered`` parts are downloaded
+    ahead of the one being written.
+
+    Arguments:
+        pool (~fs.smbfs.pool.ConnectionPool): the pool of the connections
+            to download the parts with.
+        share (str): the name of the share of the file.
+        path (str): the path of the file relative to ``share``.
+        file (io.IOBase): a file open for writing in binary mode.
+        size (int): the size of the file. The last part is read until the
+            end of the file, even if it grew in the meantime.
+        part_size (int): the size of each part. **[default: 8MiB]**
+        workers (int): the number of parts downloaded at the same time.
+            **[default: 4]**
+        max_buffered (int): the number of parts kept in memory when
+            ``file`` is written sequentially. **[default: 8]**
+        timeout (int): the timeout of each request, in seconds.
+
+    Returns:
+        int: the number of bytes written to ``file``.
+
+    """
+    offsets = range(0, max(size, 1), part_size)
+    last = offsets[-1]
+
+    if _positional(file):
+        start = file.tell()
+        lock = threading.Lock()
+
+        def fetch(offset):
+            writer = _PositionalWriter(file, lock, start + offset)
+            length = -1 if offset == last else part_size
+            with pool.connection() as con:
+                con.retrieveFileFromOffset(share, path, writer, offset, length, timeout)
+            return writer.offset - start - offset
+
+        written = sum(_ordered(fetch, offsets, workers, 2 * workers))
+        file.seek(start + written)
+        return written
+
+    def fetch(offset):
+        buffer = io.BytesIO()
+        length = -1 if offset == last else part_size
+        with pool.connection() as con:
+            con.retrieveFileFromOffset(share, path, buffer, offset, length, timeout)
+        return buffer.getvalue()
+
+    written = 0
+    for data in _ordered(fetch, offsets, workers, max(max_buffered, 1)):
+        file.write(data)
+        written += len(data)
+    return written
+
+
+def _create(con, share, path, size, timeout):
+    """Create or truncate a file, and extend it to ``size`` if supported.
+    """
+    if con.isUsingSMB2:
+        access_mask = FILE_WRITE_DATA | FILE_WRITE_ATTRIBUTES | SYNCHRONIZE
+        handle = con.openFile(share, path, access_mask, FILE_OVERWRITE_IF, timeout)
+        try:
+            con.setEndOfFile(handle, size, timeout)
+        finally:
+            con.closeFile(handle, timeout)
+    else:
+        con.storeFileFromOffset(share, path, io.BytesIO(), 0, True, timeout)
+
+
+def upload(pool, share, path, file, size, part_size=PART_SIZE, workers=4, timeout=30):
+    """Upload a file in parts written concurrently over several connections.
+
+    The destination is created, or truncated, and extended to its final
+    size before the parts are written, so that the server can allocate
+    it at once. At most ``workers`` parts are held in memory.
+
+    Arguments:
+        pool (~fs.smbfs.pool.ConnectionPool): the pool of the connections
+            to upload the parts with.
+        share (str): the name of the share of the file.
+        path (str): the path of the file relative to ``share``.
+        file (io.IOBase): a seekable file open for reading in binary mode.
+        size (int): the number of bytes to read from ``file``. The upload
+            fails if ``file`` ends before, e.g. because it was truncated.
+        part_size (int): the size of each part. **[default: 8MiB]**
+        workers (int): the number of parts uploaded at the same time.
+            **[default: 4]**
+        timeout (int): the timeout of each request, in seconds.
+
+    Returns:
+        int: the number of bytes read from ``file``.
+
+    Raises:
+        IOError: if ``file`` ends before ``size`` bytes were read.
+
+    """
+    start = file.tell()
+    lock = threading.Lock()
+    with pool.connection() as con:
+        _create(con, share, path, size, timeout)
+
+    def store(offset):
+        length = min(part_size, size - offset)
+        with lock:
+            file.seek(start + offset)
+            # raw and unbuffered files may return less than requested
+            data = file.read(length)
+            while data and len(data) < length:
+                chunk = file.read(length - len(data))
+                if not chunk:
+                    break
+                data += chunk
+        if len(data) < length:
+            raise IOError(
+                "file ended after %d bytes, expected %d"
+                % (offset + len(data), size)
+            )
+        with pool.connection() as con:
+            con.storeFileFromOffset(
+                share, path, io.BytesIO(data), offset, False, timeout
+            )
+        return len(data)
+
+    written = sum(_ordered(store, range(0, size, part_size), workers, workers))
+    file.seek(start + written)
+    return written
+
+
+def pipe(file, pool, share, path, part_size=PIPE_SIZE, max_buffered=2, timeout=30):
+    """Upload a file read sequentially, reading and writing at the same time.
+
+    A thread reads the parts of ``file`` while the previous ones are
+    written to the destination over a single pooled connection, with at
+    most ``max_buffered`` parts held in memory. Use this when reading
+    from ``file`` is about as slow as writing, e.g. when it is a file of
+    another SMB share.
+
+    Arguments:
+        file (io.IOBase): a file open for reading in binary mode.
+        pool (~fs.smbfs.pool.ConnectionPool): the pool of the connection
+            to upload the parts with.
+        share (str): the name of the share of the file.
+        path (str): the path of the file relative to ``share``.
+        part_size (int): the size of each part. **[default: 1MiB]**
+        max_buffered (int): the number of parts read ahead of the one
+            being written. **[default: 2]**
+        timeout (int): the timeout of each request, in seconds.
+
+    Returns:
+        int: the number of bytes read from ``file``.
+
+    """
+    parts = six.moves.queue.Queue(max(max_buffered, 1))
+    stopped = threading.Event()
+
+    def read():
+        try:
+            while not stopped.is_set():
+                data = file.read(part_size)
+                parts.put(data)
+                if not data:
+                    return
+        except BaseException:
+            parts.put(b'')
+            raise
+
+    written = 0
+    executor = ThreadPoolExecutor(max_workers=1)
+    reader = executor.submit(read)
+    try:
+        with pool.connection() as con:
+            if con.isUsingSMB2:
+                access_mask = FILE_WRITE_DATA | FILE_WRITE_ATTRIBUTES | SYNCHRONIZE
+                handle = con.openFile(
+                    share, path, access_mask, FILE_OVERWRITE_IF, timeout
+                )
+                try:
+                    for data in iter(parts.get, b''):
+                        written += con.writeFile(handle, written, data, timeout)
+                finally:
+                    con.closeFile(handle, timeout)
+            else:
+                _create(con, share, path, 0, timeout)
+                for data in iter(parts.get, b''):
+                    con.storeFileFromOffset(
+                        share, path, io.BytesIO(data), written, False, timeout
+                    )
+                    written += len(data)
+    finally:
+        # unblock the reader if the upload stopped before the end
+        stopped.set()
+        while not reader.done():
+            try:
+                parts.get(timeout=0.1)
+            except six.moves.queue.Empty:
+                pass
+        executor.shutdown(wait=True)
+    # raise the error of the reader, if any
+    reader.result()
+    return written
@@ -10,11 +10,15 @@ import six
 from ..path import relpath
 
 
-__all__ = ['split_path', 'is_ip']
+__all__ = ['split_path', 'is_ip', 'server_pattern']
 
 #: The compiled regex used by `is_ip`.
 _RX_IP = re.compile(r'localhost|\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}')
 
+#: The characters with a special meaning in `fnmatch` or SMB wildcards,
+#: besides ``*`` and ``?``.
+_RX_SPECIAL = re.compile(r'[\[\]<>"\\]')
+
 
 def split_path(path):
     """Split a SMBFS path into a share name and a path component.
@@ -34,6 +38,28 @@ def split_path(path):
     return path.split('/', 1)
 
 
+def server_pattern(patterns):
+    """Get a wildcard for the server selecting the names matching ``patterns``.
+
+    Only a single pattern using no other wildcards than ``*`` and ``?`` can
+    be evaluated by an SMB server; the server may return a superset of the
+    matching names (e.g. by matching short names), so the names must still
+    be checked by the client.
+
+    Example:
+        >>> from fs.smbfs.utils import server_pattern
+        >>> server_pattern(['*.py'])
+        '*.py'
+        >>> server_pattern(['*.py', '*.pyc'])
+        '*'
+        >>> server_pattern(['[a-z]*.py'])
+        '*'
+    """
+    if patterns is None or len(patterns) != 1 or _RX_SPECIAL.search(patterns[0]):
+        return '*'
+    return patterns[0]
+
+
 def is_ip(token):
     """Return True if ``token`` is an IP adress, using a regex.
 
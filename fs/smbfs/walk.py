@@ -0,0 +1,349 @@
+# coding: utf-8
+"""Implementation of `SMBWalker`.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+from ..errors import FSError
+from ..glob import BoundGlobber, Globber, GlobMatch
+from ..path import combine, iteratepath
+from ..walk import BoundWalker, Walker
+from ..wrapfs import WrapFS
+
+try:
+    from ..glob import _PATTERN_CACHE, _translate_glob
+except ImportError:  # pragma: no cover
+    _PATTERN_CACHE = _translate_glob = None
+
+
+__all__ = ['SMBWalker', 'SMBGlobber', 'SMBBoundGlobber']
+
+
+class _Prefetcher(object):
+    """List directories ahead of a walk using a thread pool.
+
+    Directories are listed in the order they are scheduled, or with the
+    most recently scheduled first if ``lifo`` is `True`. At most
+    ``max_queued`` listings are running or waiting to be consumed at
+    any time.
+    """
+
+    def __init__(self, function, workers, max_queued, lifo=False):
+        self._list = function
+        self._max_queued = max_queued
+        self._lifo = lifo
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._pending = collections.deque()
+        self._scheduled = set()
+        self._futures = {}
+
+    def _submit(self):
+        while self._pending and len(self._futures) < self._max_queued:
+            dir_path = self._pending.popleft()
+            if dir_path in self._scheduled:
+                self._scheduled.discard(dir_path)
+                self._futures[dir_path] = self._executor.submit(self._list, dir_path)
+
+    def schedule(self, dir_paths):
+        """Schedule the listing of several directories.
+        """
+        if self._lifo:
+            self._pending.extendleft(reversed(dir_paths))
+        else:
+            self._pending.extend(dir_paths)
+        self._scheduled.update(dir_paths)
+        self._submit()
+
+    def scan(self, dir_path):
+        """Get the list of `~fs.info.Info` of a directory.
+
+        The listing is taken from the prefetched ones if available, and
+        made in the calling thread otherwise.
+        """
+        future = self._futures.pop(dir_path, None)
+        self._scheduled.discard(dir_path)
+        try:
+            if future is not None:
+                return future.result()
+            return self._list(dir_path)
+        finally:
+            self._submit()
+
+    def close(self):
+        """Cancel the pending listings and stop the worker threads.
+        """
+        self._pending.clear()
+        self._scheduled.clear()
+        for future in self._futures.values():
+            future.cancel()
+        self._futures.clear()
+        self._executor.shutdown(wait=True)
+
+
+class SMBWalker(Walker):
+    """A walker listing several directories concurrently.
+
+    Listing a directory over SMB is bound by the latency of the server
+    rather than by its bandwidth, so this walker lists the directories it
+    is about to visit in parallel, using pooled connections, while keeping
+    the order of the results of `fs.walk.Walker`.
+
+    Arguments:
+        workers (int, optional): the number of directories listed at the
+            same time. Defaults to the size of the connection pool of the
+            `SMBFS` being walked.
+        max_queued (int): the maximum number of directory listings
+            prefetched ahead of the walk, which bounds the memory used to
+            hold listings not consumed yet. **[default: 256]**
+        patterns (list, optional): a wildcard for each level below the
+            walked directory, that the names of the resources of that level
+            must match. Resources not matching are filtered by the server
+            when possible, and are neither yielded nor walked into.
+        **kwargs: the arguments of `fs.walk.Walker`.
+
+    """
+
+    def __init__(
+        self, workers=None, max_queued=256, patterns=None, **kwargs
+    ):  # noqa: D107
+        super(SMBWalker, self).__init__(**kwargs)
+        if max_queued < 1:
+            raise ValueError("max_queued must be at least 1")
+        self.workers = workers
+        self.max_queued = max_queued
+        self.patterns = patterns
+
+    @classmethod
+    def bind(cls, fs):  # noqa: D102
+        # `Walker.bind` always binds a `Walker`, whatever the subclass
+        return BoundWalker(fs, walker_class=cls)
+
+    def _scan(self, fs, dir_path, namespaces=None, pattern=None):
+        """Get an iterator of `Info` objects for a directory path.
+
+        If ``pattern`` is given, only the resources matching it are listed.
+        """
+        try:
+            if pattern is None:
+                infos = fs.scandir(dir_path, namespaces=namespaces)
+            else:
+                infos = fs.filterdir(
+                    dir_path, files=[pattern], dirs=[pattern], namespaces=namespaces
+                )
+            for info in infos:
+                yield info
+        except FSError as error:
+            if not self.on_error(dir_path, error):
+                raise
+
+    def _lister(self, fs, path, namespaces):
+        """Get a function listing a directory during a walk of ``path``.
+        """
+        depth = self._calculate_depth(path)
+        patterns = self.patterns or ()
+
+        def list_dir(dir_path):
+            level = self._calculate_depth(dir_path) - depth
+            pattern = patterns[level] if level < len(patterns) else None
+            return list(self._scan(fs, dir_path, namespaces, pattern))
+
+        return list_dir
+
+    def _get_workers(self, fs):
+        """Get the number of worker threads to use to walk ``fs``.
+        """
+        if self.workers is not None:
+            return self.workers
+        while isinstance(fs, WrapFS):
+            fs = fs.delegate_fs()
+        pool = getattr(fs, "_pool", None)
+        return 1 if pool is None else pool.maxsize
+
+    def _check_dirs(self, fs, dir_path, infos, depth):
+        """Check which directories of a listing are opened and scanned.
+
+        Returns:
+            (set, list): the names of the directories to open, and the
+            paths of the directories to scan, in listing order.
+
+        """
+        _depth = self._calculate_depth(dir_path) - depth + 1
+        opened, scanned = set(), []
+        for info in infos:
+            if info.is_dir and self._check_open_dir(fs, dir_path, info):
+                opened.add(info.name)
+                if self._check_scan_dir(fs, dir_path, info, _depth):
+                    scanned.append(combine(dir_path, info.name))
+        return opened, scanned
+
+    def _walk_breadth(self, fs, path, namespaces=None):
+        """Walk files using a *breadth first* search."""
+        prefetcher = _Prefetcher(
+            self._lister(fs, path, namespaces),
+            self._get_workers(fs),
+            self.max_queued,
+        )
+        queue = collections.deque([path])
+        depth = self._calculate_depth(path)
+
+        try:
+            while queue:
+                dir_path = queue.popleft()
+                infos = prefetcher.scan(dir_path)
+                opened, scanned = self._check_dirs(fs, dir_path, infos, depth)
+                prefetcher.schedule(scanned)
+                queue.extend(scanned)
+                for info in infos:
+                    if info.is_dir:
+                        if info.name in opened:
+                            yield dir_path, info  # Opened a directory
+                    elif self.check_file(fs, info):
+                        yield dir_path, info  # Found a file
+                yield dir_path, None  # End of directory
+        finally:
+            prefetcher.close()
+
+    def _walk_depth(self, fs, path, namespaces=None):
+        """Walk files using a *depth first* search."""
+        prefetcher = _Prefetcher(
+            self._lister(fs, path, namespaces),
+            self._get_workers(fs),
+            self.max_queued,
+            lifo=True,
+        )
+        depth = self._calculate_depth(path)
+
+        def scan(dir_path):
+            infos = prefetcher.scan(dir_path)
+            opened, scanned = self._check_dirs(fs, dir_path, infos, depth)
+            prefetcher.schedule(scanned)
+            return dir_path, iter(infos), opened, set(scanned)
+
+        try:
+            stack = [scan(path) + (None,)]
+            while stack:
+                dir_path, iter_files, opened, scanned, parent = stack[-1]
+                info = next(iter_files, None)
+                if info is None:
+                    if parent is not None:
+                        yield parent
+                    yield dir_path, None
+                    del stack[-1]
+                elif info.is_dir:
+                    _path = combine(dir_path, info.name)
+                    if _path in scanned:
+                        stack.append(scan(_path) + ((dir_path, info),))
+                    elif info.name in opened:
+                        yield dir_path, info
+                elif self.check_file(fs, info):
+                    yield dir_path, info
+        finally:
+            prefetcher.close()
+
+
+def _translate_glob_cached(pattern, case_sensitive):
+    """Translate a glob pattern like `fs.glob.Globber` does.
+
+    Returns:
+        tuple: the number of levels of the pattern, whether it contains
+        ``**``, and the compiled regular expression paths must match, or
+        `None` if the private helpers of `fs.glob` are not available.
+
+    """
+    if _translate_glob is None:
+        return None
+    key = (pattern, case_sensitive)
+    try:
+        translated = _PATTERN_CACHE[key]
+    except KeyError:
+        try:
+            translated = _translate_glob(pattern, case_sensitive=case_sensitive)
+        except TypeError:
+            return None
+        _PATTERN_CACHE[key] = translated
+    # the helpers are private, and may change in another version of `fs`
+    if not isinstance(translated, tuple) or len(translated) != 3:
+        return None
+    return translated
+
+
+class SMBGlobber(Globber):
+    """A globber letting the server filter the names at each level.
+
+    The components of the glob pattern before any ``**`` are passed to
+    `SMBWalker` as per-level wildcards, so that the directories not
+    matching them are never listed. The matches are otherwise the same
+    as the ones of `fs.glob.Globber`, whose iteration this globber
+    replaces using private helpers of `fs.glob`: with a version of `fs`
+    without them, it iterates like `fs.glob.Globber`.
+
+    Note:
+        Only `SMBFS.glob` creates this globber: globbing a `~fs.subfs.SubFS`
+        of a `SMBFS`, e.g. one returned by `~fs.base.FS.opendir`, uses
+        `fs.glob.Globber`, which lists every directory of the tree, and
+        the ``filter`` of `SMBFS.walk` is always applied by the client.
+
+    """
+
+    def _make_iter(self, search="breadth", namespaces=None):
+        translated = _translate_glob_cached(self.pattern, self.case_sensitive)
+        if translated is None:
+            for match in super(SMBGlobber, self)._make_iter(search, namespaces):
+                yield match
+            return
+        levels, recursive, re_pattern = translated
+
+        walk = self.fs.walk
+        options = {}
+        # the wildcards must select at least the resources the pattern does
+        case_insensitive = self.fs.getmeta().get("case_insensitive", False)
+        if issubclass(walk.walker_class, SMBWalker) and (
+            self.case_sensitive or case_insensitive
+        ):
+            patterns = []
+            for component in iteratepath(self.pattern):
+                if component == "**":
+                    break
+                patterns.append(component)
+            # the pattern is matched against absolute paths, so its first
+            # components are the ones of the walked directory
+            options["patterns"] = patterns[len(iteratepath(self.path)):]
+
+        for path, info in walk.info(
+            path=self.path,
+            namespaces=namespaces or self.namespaces,
+            max_depth=None if recursive else levels,
+            search=search,
+            exclude_dirs=getattr(self, "exclude_dirs", None),
+            **options
+        ):
+            if info.is_dir:
+                path += "/"
+            if re_pattern.match(path):
+                yield GlobMatch(path, info)
+
+
+class SMBBoundGlobber(BoundGlobber):
+    """A `BoundGlobber` creating `SMBGlobber` instances.
+    """
+
+    __slots__ = []
+
+    def __call__(
+        self, pattern, path="/", namespaces=None, case_sensitive=True, exclude_dirs=None
+    ):  # noqa: D102
+        options = {}
+        # older versions of `Globber` do not take ``exclude_dirs``
+        if exclude_dirs is not None:
+            options["exclude_dirs"] = exclude_dirs
+        return SMBGlobber(
+            self.fs,
+            pattern,
+            path,
+            namespaces=namespaces,
+            case_sensitive=case_sensitive,
+            **options
+        )
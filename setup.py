@@ -1,5 +1,24 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+import sys
+
 import setuptools
-setuptools.setup()
+from setuptools.command.build_py import build_py as _build_py
+
+
+class build_py(_build_py):
+    """Skip the modules using a syntax the running Python cannot compile.
+    """
+
+    #: The modules requiring Python 3.5 or later.
+    py35_modules = [("fs.smbfs", "aio")]
+
+    def find_package_modules(self, package, package_dir):
+        modules = _build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info < (3, 5):
+            modules = [m for m in modules if m[:2] not in self.py35_modules]
+        return modules
+
+
+setuptools.setup(cmdclass={"build_py": build_py})
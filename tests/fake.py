@@ -0,0 +1,518 @@
+# coding: utf-8
+"""An in-memory fake of the SMB connections used by `SMBFS` and `SMBFile`.
+
+`FakeSMBServer` holds the shares, and hands out `FakeSMBConnection`
+instances implementing the subset of `fs.smbfs.connection.SMBConnection`
+used by `fs.smbfs`. Every call to a method of a connection counts as one
+request, in the same unit as `fs.smbfs.metrics.Metrics.requests`, and can
+be delayed to simulate the latency of a real server. Connections are
+created lazily, so the patch must outlive the filesystem:
+
+    >>> server = FakeSMBServer(["data"], latency=0.01)
+    >>> with mock.patch("fs.smbfs.smbfs.SMBConnection", server.connection):
+    ...     smb_fs = SMBFS(("127.0.0.1", "FAKE"), direct_tcp=True)
+    ...     smb_fs.getinfo("/data")
+
+Paths are case sensitive, and files are locked by nobody.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import contextlib
+import fnmatch
+import itertools
+import threading
+import time
+
+import smb.base
+import smb.smb2_constants
+import smb.smb_constants
+import smb.security_descriptors
+from smb.smb_structs import OperationFailure
+
+from fs.smbfs.connection import (
+    FileHandle,
+    STATUS_FILE_IS_A_DIRECTORY,
+    STATUS_NOT_A_DIRECTORY,
+    STATUS_NOT_SUPPORTED,
+    STATUS_OBJECT_NAME_COLLISION,
+    STATUS_OBJECT_NAME_NOT_FOUND,
+    STATUS_OBJECT_PATH_NOT_FOUND,
+)
+
+#: [MS-ERREF]: STATUS_ACCESS_DENIED
+STATUS_ACCESS_DENIED = 0xC0000022
+
+#: [MS-ERREF]: STATUS_DIRECTORY_NOT_EMPTY
+STATUS_DIRECTORY_NOT_EMPTY = 0xC0000101
+
+#: The methods only available when the server speaks SMB2.
+_SMB2_ONLY = frozenset([
+    'openFile',
+    'closeFile',
+    'readFile',
+    'writeFile',
+    'queryFileSize',
+    'setEndOfFile',
+    'renamePath',
+    'requestResumeKey',
+    'copyFile',
+])
+
+
+#: The reply carried by the `OperationFailure` of a failed request.
+_Reply = collections.namedtuple('_Reply', ['command', 'status'])
+
+
+def _fail(message, status, command=smb.smb2_constants.SMB2_COM_CREATE):
+    raise OperationFailure(message, [_Reply(command, status)])
+
+
+def _split(path):
+    """Split a path on a share in its components.
+    """
+    return [part for part in path.replace('\\', '/').split('/') if part]
+
+
+class _Node(object):
+    """A file or a directory on a share.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, is_dir):
+        self.is_dir = is_dir
+        self.data = bytearray()
+        self.children = collections.OrderedDict() if is_dir else None
+        self.file_id = next(self._ids)
+        self.created = self.modified = time.time()
+
+    def touch(self):
+        self.modified = time.time()
+
+    def shared_file(self, name):
+        if self.is_dir:
+            attributes = smb.smb_constants.ATTR_DIRECTORY
+        else:
+            attributes = smb.smb_constants.ATTR_NORMAL
+        return smb.base.SharedFile(
+            self.created, self.modified, self.modified, self.modified,
+            len(self.data), len(self.data), attributes, '', name, self.file_id,
+        )
+
+
+class FakeSMBServer(object):
+    """An in-memory SMB server shared by the connections it creates.
+
+    Arguments:
+        shares (list): the names of the disk shares of the server.
+        latency (float or callable): the number of seconds every request
+            is delayed by, or a function called with the name of the
+            method to get its delay.
+        smb2 (bool): set to `False` to simulate an SMB1 server, without
+            the handle-based methods.
+        server_copy (bool): set to `False` to reject server-side copies
+            with ``STATUS_NOT_SUPPORTED``.
+
+    Attributes:
+        calls (collections.Counter): the number of requests of each
+            method, since the last `reset`.
+        log (list): the name of the method of each request, in order.
+        active (int): the number of requests being processed.
+        peak (int): the highest value of ``active`` since the last `reset`.
+        connections (list): the connections created by the server.
+        owners (dict): the relative identifier of the owner of the
+            resources of each share, ``1000`` if missing.
+
+    """
+
+    def __init__(self, shares=("data",), latency=0.0, smb2=True, server_copy=True):
+        self.shares = collections.OrderedDict(
+            (name, _Node(is_dir=True)) for name in shares
+        )
+        self.latency = latency
+        self.smb2 = smb2
+        self.server_copy = server_copy
+        self.connections = []
+        self.owners = {}
+        self.lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        """Forget the requests made so far.
+        """
+        with self.lock:
+            self.calls = collections.Counter()
+            self.log = []
+            self.active = self.peak = 0
+
+    @property
+    def requests(self):
+        """`int`: the number of requests made since the last `reset`.
+        """
+        return sum(self.calls.values())
+
+    def connection(self, *args, **kwargs):
+        """Create a new connection, with the arguments of `SMBConnection`.
+        """
+        con = FakeSMBConnection(self)
+        with self.lock:
+            self.connections.append(con)
+        return con
+
+    def delay(self, name):
+        """Get the number of seconds a request of ``name`` is delayed by.
+        """
+        return self.latency(name) if callable(self.latency) else self.latency
+
+    def lookup(self, share, path):
+        """Get the node at ``path`` on ``share``, or `None`.
+        """
+        node = self.shares.get(share)
+        for part in _split(path):
+            if node is None or not node.is_dir:
+                return None
+            node = node.children.get(part)
+        return node
+
+    def parent(self, share, path):
+        """Get the parent directory of ``path`` and the name of ``path``.
+
+        Raises:
+            smb.smb_structs.OperationFailure: if the parent directory
+                does not exist.
+
+        """
+        parts = _split(path)
+        parent = self.lookup(share, '/'.join(parts[:-1]))
+        if not parts or parent is None or not parent.is_dir:
+            _fail('No parent for %s on %s' % (path, share), STATUS_OBJECT_PATH_NOT_FOUND)
+        return parent, parts[-1]
+
+    def makedirs(self, share, path):
+        """Create a directory and its missing parents, without a request.
+        """
+        with self.lock:
+            node = self.shares[share]
+            for part in _split(path):
+                node = node.children.setdefault(part, _Node(is_dir=True))
+
+    def writebytes(self, share, path, data):
+        """Create or replace a file, without a request.
+        """
+        with self.lock:
+            parts = _split(path)
+            self.makedirs(share, '/'.join(parts[:-1]))
+            parent, name = self.parent(share, path)
+            node = parent.children.setdefault(name, _Node(is_dir=False))
+            node.data[:] = data
+            node.touch()
+
+    def readbytes(self, share, path):
+        """Get the contents of a file, without a request.
+        """
+        with self.lock:
+            return bytes(self.lookup(share, path).data)
+
+
+class FakeSMBConnection(object):
+    """A connection to a `FakeSMBServer`.
+
+    Like a real connection, it cannot be used by several threads at the
+    same time: a concurrent request raises an `AssertionError`.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.connected = False
+        self._busy = threading.Lock()
+        self._handles = {}
+        self._fids = itertools.count(1)
+
+    @property
+    def isUsingSMB2(self):
+        return self.server.smb2
+
+    @contextlib.contextmanager
+    def _request(self, name):
+        """Count a request, delay it, and process it with the server locked.
+        """
+        if not self._busy.acquire(False):
+            raise AssertionError("connection used by several threads at once")
+        server = self.server
+        try:
+            if name != 'connect' and not self.connected:
+                raise smb.base.NotConnectedError('Not connected to server')
+            if name in _SMB2_ONLY and not server.smb2:
+                raise NotImplementedError('%s is only available over SMB2' % name)
+            with server.lock:
+                server.calls[name] += 1
+                server.log.append(name)
+                server.active += 1
+                server.peak = max(server.peak, server.active)
+            try:
+                delay = server.delay(name)
+                if delay:
+                    time.sleep(delay)
+                with server.lock:
+                    yield
+            finally:
+                with server.lock:
+                    server.active -= 1
+        finally:
+            self._busy.release()
+
+    def _file(self, share, path):
+        node = self.server.lookup(share, path)
+        if node is None:
+            _fail('Cannot find %s on %s' % (path, share), STATUS_OBJECT_NAME_NOT_FOUND)
+        elif node.is_dir:
+            _fail('%s on %s is a directory' % (path, share), STATUS_FILE_IS_A_DIRECTORY)
+        return node
+
+    def _directory(self, share, path):
+        node = self.server.lookup(share, path)
+        if node is None:
+            _fail('Cannot find %s on %s' % (path, share), STATUS_OBJECT_NAME_NOT_FOUND)
+        elif not node.is_dir:
+            _fail('%s on %s is not a directory' % (path, share), STATUS_NOT_A_DIRECTORY)
+        return node
+
+    def _create_file(self, share, path):
+        parent, name = self.server.parent(share, path)
+        node = parent.children.get(name)
+        if node is None:
+            node = parent.children[name] = _Node(is_dir=False)
+        elif node.is_dir:
+            _fail('%s on %s is a directory' % (path, share), STATUS_FILE_IS_A_DIRECTORY)
+        return node
+
+    def _node(self, handle):
+        return self._handles[handle.fid]
+
+    # --- Session ------------------------------------------------------------
+
+    def connect(self, ip, port=139, sock_family=None, timeout=60):
+        with self._request('connect'):
+            self.connected = True
+            return True
+
+    def close(self):
+        self.connected = False
+        self._handles.clear()
+
+    def echo(self, data, timeout=10):
+        with self._request('echo'):
+            return data
+
+    def listShares(self, timeout=30):
+        with self._request('listShares'):
+            shares = [
+                smb.base.SharedDevice(smb.base.SharedDevice.DISK_TREE, name, '')
+                for name in self.server.shares
+            ]
+            shares.append(smb.base.SharedDevice(smb.base.SharedDevice.IPC, 'IPC$', ''))
+            return shares
+
+    # --- Metadata -----------------------------------------------------------
+
+    def listPath(self, service_name, path, search=0xFFFF, pattern='*', timeout=30):
+        with self._request('listPath'):
+            node = self._directory(service_name, path)
+            entries = [('.', node), ('..', node)]
+            entries.extend(node.children.items())
+            results = []
+            for name, child in entries:
+                if not fnmatch.fnmatch(name.lower(), pattern.lower()):
+                    continue
+                shared_file = child.shared_file(name)
+                # filter the attributes on the client, like pysmb does
+                if shared_file.file_attributes & 0xff == smb.smb_constants.ATTR_NORMAL:
+                    accept = search & smb.smb_constants.SMB_FILE_ATTRIBUTE_INCL_NORMAL
+                else:
+                    accept = shared_file.file_attributes & search
+                if accept:
+                    results.append(shared_file)
+            return results
+
+    def getAttributes(self, service_name, path, timeout=30):
+        with self._request('getAttributes'):
+            node = self.server.lookup(service_name, path)
+            if node is None:
+                _fail('Cannot find %s on %s' % (path, service_name), STATUS_OBJECT_NAME_NOT_FOUND)
+            parts = _split(path)
+            return node.shared_file(parts[-1] if parts else '')
+
+    def getSecurity(self, service_name, path, timeout=30):
+        with self._request('getSecurity'):
+            if self.server.lookup(service_name, path) is None:
+                _fail('Cannot find %s on %s' % (path, service_name), STATUS_OBJECT_NAME_NOT_FOUND)
+            sd = smb.security_descriptors
+            everyone = sd.SID(1, 1, [0])
+            ace = sd.ACE(sd.ACE_TYPE_ACCESS_ALLOWED, 0, 0x001F01FF, everyone, {})
+            owner = self.server.owners.get(service_name, 1000)
+            return sd.SecurityDescriptor(
+                0, sd.SID(1, 5, [21, 1, 2, 3, owner]), sd.SID(1, 5, [21, 1, 2, 3, 513]),
+                sd.ACL(2, [ace]), None,
+            )
+
+    # --- Whole-file operations ----------------------------------------------
+
+    def retrieveFile(self, service_name, path, file_obj, timeout=30):
+        with self._request('retrieveFile'):
+            data = bytes(self._file(service_name, path).data)
+        file_obj.write(data)
+        return smb.smb_constants.ATTR_NORMAL, len(data)
+
+    def retrieveFileFromOffset(self, service_name, path, file_obj, offset=0, max_length=-1, timeout=30):
+        with self._request('retrieveFileFromOffset'):
+            data = self._file(service_name, path).data
+            end = len(data) if max_length < 0 else offset + max_length
+            data = bytes(data[offset:end])
+        file_obj.write(data)
+        return smb.smb_constants.ATTR_NORMAL, len(data)
+
+    def storeFile(self, service_name, path, file_obj, timeout=30):
+        data = file_obj.read()
+        with self._request('storeFile'):
+            self._store(service_name, path, data, 0, True)
+        return len(data)
+
+    def storeFileFromOffset(self, service_name, path, file_obj, offset=0, truncate=False, timeout=30):
+        data = file_obj.read()
+        with self._request('storeFileFromOffset'):
+            self._store(service_name, path, data, offset, truncate)
+        return offset + len(data)
+
+    def _store(self, share, path, data, offset, truncate):
+        node = self._create_file(share, path)
+        if truncate:
+            del node.data[:]
+        if offset > len(node.data):
+            node.data.extend(b'\0' * (offset - len(node.data)))
+        node.data[offset:offset + len(data)] = data
+        node.touch()
+
+    # --- Namespace ----------------------------------------------------------
+
+    def createDirectory(self, service_name, path, timeout=30):
+        with self._request('createDirectory'):
+            parent, name = self.server.parent(service_name, path)
+            if name in parent.children:
+                _fail('%s exists on %s' % (path, service_name), STATUS_OBJECT_NAME_COLLISION)
+            parent.children[name] = _Node(is_dir=True)
+
+    def deleteDirectory(self, service_name, path, timeout=30):
+        with self._request('deleteDirectory'):
+            node = self._directory(service_name, path)
+            if node.children:
+                _fail('%s on %s is not empty' % (path, service_name), STATUS_DIRECTORY_NOT_EMPTY)
+            parent, name = self.server.parent(service_name, path)
+            del parent.children[name]
+
+    def deleteFiles(self, service_name, path_file_pattern, delete_matching_folders=False, timeout=30):
+        with self._request('deleteFiles'):
+            parts = _split(path_file_pattern)
+            parent = self._directory(service_name, '/'.join(parts[:-1]))
+            for name, child in list(parent.children.items()):
+                if not fnmatch.fnmatch(name.lower(), parts[-1].lower()):
+                    continue
+                if not child.is_dir:
+                    del parent.children[name]
+                elif delete_matching_folders and not child.children:
+                    del parent.children[name]
+
+    def rename(self, service_name, old_path, new_path, timeout=30):
+        with self._request('rename'):
+            self._rename(service_name, old_path, new_path, False)
+
+    def _rename(self, share, old_path, new_path, replace):
+        old_parent, old_name = self.server.parent(share, old_path)
+        if old_name not in old_parent.children:
+            _fail('Cannot find %s on %s' % (old_path, share), STATUS_OBJECT_NAME_NOT_FOUND)
+        command = smb.smb2_constants.SMB2_COM_SET_INFO
+        try:
+            new_parent, new_name = self.server.parent(share, new_path)
+        except OperationFailure:
+            _fail('No parent for %s on %s' % (new_path, share), STATUS_OBJECT_PATH_NOT_FOUND, command)
+        target = new_parent.children.get(new_name)
+        if target is not None:
+            if not replace:
+                _fail('%s exists on %s' % (new_path, share), STATUS_OBJECT_NAME_COLLISION, command)
+            elif target.is_dir:
+                _fail('Cannot replace %s on %s' % (new_path, share), STATUS_ACCESS_DENIED, command)
+        new_parent.children[new_name] = old_parent.children.pop(old_name)
+
+    # --- Handles ------------------------------------------------------------
+
+    def openFile(self, service_name, path, access_mask, create_disp, timeout=30, create_options=smb.smb_constants.FILE_NON_DIRECTORY_FILE):
+        with self._request('openFile'):
+            node = self._open(service_name, path, create_disp, create_options)
+            fid = next(self._fids)
+            self._handles[fid] = node
+            return FileHandle(service_name, path, 0, fid, len(node.data))
+
+    def _open(self, share, path, create_disp, create_options):
+        node = self.server.lookup(share, path)
+        if node is None:
+            if create_disp in (smb.smb_constants.FILE_OPEN, smb.smb_constants.FILE_OVERWRITE):
+                _fail('Cannot find %s on %s' % (path, share), STATUS_OBJECT_NAME_NOT_FOUND)
+            node = self._create_file(share, path)
+        elif create_disp == smb.smb_constants.FILE_CREATE:
+            _fail('%s exists on %s' % (path, share), STATUS_OBJECT_NAME_COLLISION)
+        elif node.is_dir and create_options & smb.smb_constants.FILE_NON_DIRECTORY_FILE:
+            _fail('%s on %s is a directory' % (path, share), STATUS_FILE_IS_A_DIRECTORY)
+        elif not node.is_dir and create_options & smb.smb_constants.FILE_DIRECTORY_FILE:
+            _fail('%s on %s is not a directory' % (path, share), STATUS_NOT_A_DIRECTORY)
+        elif create_disp in (smb.smb_constants.FILE_OVERWRITE, smb.smb_constants.FILE_OVERWRITE_IF):
+            del node.data[:]
+            node.touch()
+        return node
+
+    def closeFile(self, handle, timeout=30):
+        with self._request('closeFile'):
+            del self._handles[handle.fid]
+
+    def readFile(self, handle, offset, length, timeout=30):
+        with self._request('readFile'):
+            return bytes(self._node(handle).data[offset:offset + length])
+
+    def writeFile(self, handle, offset, data, timeout=30):
+        with self._request('writeFile'):
+            node = self._node(handle)
+            if offset > len(node.data):
+                node.data.extend(b'\0' * (offset - len(node.data)))
+            node.data[offset:offset + len(data)] = data
+            node.touch()
+        return len(data)
+
+    def queryFileSize(self, handle, timeout=30):
+        with self._request('queryFileSize'):
+            return len(self._node(handle).data)
+
+    def setEndOfFile(self, handle, size, timeout=30):
+        with self._request('setEndOfFile'):
+            node = self._node(handle)
+            del node.data[size:]
+            node.data.extend(b'\0' * (size - len(node.data)))
+            node.touch()
+
+    def renamePath(self, service_name, old_path, new_path, replace=False, create_options=0, timeout=30):
+        with self._request('renamePath'):
+            self._open(service_name, old_path, smb.smb_constants.FILE_OPEN, create_options)
+            self._rename(service_name, old_path, new_path, replace)
+
+    def requestResumeKey(self, handle, timeout=30):
+        with self._request('requestResumeKey'):
+            return b'\0' * 24
+
+    def copyFile(self, source, target, length, timeout=30):
+        with self._request('copyFile'):
+            if not self.server.server_copy:
+                _fail('Server-side copy failed', STATUS_NOT_SUPPORTED, smb.smb2_constants.SMB2_COM_IOCTL)
+            data = self._node(source).data[:length]
+            node = self._node(target)
+            node.data[:len(data)] = data
+            node.touch()
+            return len(data)
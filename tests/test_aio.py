@@ -0,0 +1,163 @@
+# coding: utf-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import io
+import threading
+import time
+import unittest
+
+import six
+
+import fs.errors
+import fs.memoryfs
+
+from .fake import FakeSMBServer
+from .utils import mock
+
+if six.PY3:
+    import asyncio
+    from fs.smbfs.aio import AsyncSMBFS, AsyncSMBFile
+
+
+@unittest.skipIf(six.PY2, "asyncio requires Python 3")
+class TestAsyncSMBFS(unittest.TestCase):
+
+    def setUp(self):
+        self.fs = fs.memoryfs.MemoryFS()
+        self.fs.makedir("foo")
+        self.fs.writebytes("foo/bar", b"line 1\nline 2\n")
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.afs = AsyncSMBFS(self.fs, workers=2)
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.afs.close())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_metadata(self):
+        info = self.run_async(self.afs.getinfo("foo/bar", ["details"]))
+        self.assertEqual(info.size, 14)
+        self.assertTrue(self.run_async(self.afs.isdir("foo")))
+        self.assertFalse(self.run_async(self.afs.exists("baz")))
+        self.assertEqual(self.run_async(self.afs.listdir("foo")), ["bar"])
+        infos = self.run_async(self.afs.scandir("foo"))
+        self.assertEqual([info.name for info in infos], ["bar"])
+        self.assertRaises(
+            fs.errors.ResourceNotFound, self.run_async, self.afs.getinfo("baz")
+        )
+
+    def test_bytes(self):
+        self.run_async(self.afs.writebytes("foo/baz", b"baz"))
+        self.assertEqual(self.run_async(self.afs.readbytes("foo/baz")), b"baz")
+        buffer = io.BytesIO()
+        self.run_async(self.afs.download("foo/bar", buffer))
+        self.assertEqual(buffer.getvalue(), b"line 1\nline 2\n")
+        self.run_async(self.afs.upload("foo/qux", io.BytesIO(b"qux")))
+        self.assertEqual(self.fs.readbytes("foo/qux"), b"qux")
+
+    def test_concurrency(self):
+        lock = threading.Lock()
+        active = []
+        peak = []
+        getinfo = self.fs.getinfo
+
+        def slow_getinfo(path, namespaces=None):
+            with lock:
+                active.append(path)
+                peak.append(len(active))
+            time.sleep(0.01)
+            with lock:
+                active.remove(path)
+            return getinfo(path, namespaces)
+
+        self.fs.getinfo = slow_getinfo
+        calls = [self.afs.getinfo("foo/bar") for _ in range(20)]
+        infos = self.run_async(asyncio.gather(*calls))
+        self.assertEqual(len(infos), 20)
+        # the calls share the threads of the executor
+        self.assertLessEqual(max(peak), 2)
+
+    def test_openbin(self):
+        f = self.run_async(self.afs.openbin("foo/bar"))
+        self.assertIsInstance(f, AsyncSMBFile)
+        lines = []
+        while True:
+            try:
+                lines.append(self.run_async(f.__anext__()))
+            except StopAsyncIteration:
+                break
+        self.run_async(f.__aexit__(None, None, None))
+        self.assertEqual(lines, [b"line 1\n", b"line 2\n"])
+        self.assertTrue(f.closed)
+
+    def test_openbin_write(self):
+        f = self.run_async(self.afs.openbin("foo/bar", "r+"))
+        self.assertEqual(self.run_async(f.read(4)), b"line")
+        # the calls to a file are run in order
+        self.run_async(asyncio.gather(f.write(b"!"), f.write(b"?")))
+        self.assertEqual(f.tell(), 6)
+        self.run_async(f.seek(0))
+        self.run_async(f.truncate(8))
+        self.run_async(f.close())
+        self.assertEqual(self.fs.readbytes("foo/bar"), b"line!?\nl")
+
+
+@unittest.skipIf(six.PY2, "asyncio requires Python 3")
+class TestAsyncSMBFSFake(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeSMBServer(["data"], latency=0.01)
+        self.server.writebytes("data", "foo/bar", b"line 1\nline 2\n")
+        patcher = mock.patch("fs.smbfs.smbfs.SMBConnection", self.server.connection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        connect = AsyncSMBFS.connect(("127.0.0.1", "FAKE"), direct_tcp=True)
+        self.afs = self.run_async(connect)
+
+    def tearDown(self):
+        self.run_async(self.afs.close())
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_metadata(self):
+        self.assertEqual(self.run_async(self.afs.listdir("/data/foo")), ["bar"])
+        info = self.run_async(self.afs.getinfo("/data/foo/bar", ["details"]))
+        self.assertEqual(info.size, 14)
+
+        async def exists():
+            calls = [self.afs.exists("/data/foo/{}".format(i)) for i in range(8)]
+            return await asyncio.gather(*calls)
+
+        self.assertEqual(self.run_async(exists()), [False] * 8)
+
+    def test_openbin(self):
+        async def copy():
+            async with await self.afs.openbin("/data/foo/bar") as src:
+                async with await self.afs.openbin("/data/foo/baz", "w") as dst:
+                    async for line in src:
+                        await dst.write(line.upper())
+
+        self.run_async(copy())
+        self.assertEqual(self.server.readbytes("data", "foo/baz"), b"LINE 1\nLINE 2\n")
+
+    def test_close(self):
+        async def write_and_close():
+            f = await self.afs.openbin("/data/foo/baz", "w")
+            # neither the writes nor the close of the file are awaited
+            tasks = [asyncio.ensure_future(f.write(b"x" * 1000)) for _ in range(4)]
+            tasks.append(asyncio.ensure_future(f.close()))
+            await self.afs.close()
+            return tasks
+
+        tasks = self.run_async(write_and_close())
+        self.assertTrue(all(task.done() for task in tasks))
+        self.assertEqual(self.server.readbytes("data", "foo/baz"), b"x" * 4000)
+        self.assertTrue(self.afs.fs.isclosed())
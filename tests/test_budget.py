@@ -0,0 +1,302 @@
+# coding: utf-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import contextlib
+import io
+import threading
+import unittest
+
+from fs.errors import FileExists
+from fs.smbfs import SMBFS
+
+from .fake import FakeSMBConnection, FakeSMBServer
+from .utils import mock
+
+
+class _FakeTestCase(unittest.TestCase):
+
+    smb2 = True
+    latency = 0.0
+    options = {}
+
+    def setUp(self):
+        self.server = FakeSMBServer(["data", "other"], latency=self.latency, smb2=self.smb2)
+        self.server.writebytes("data", "foo/bar", b"line\n" * 100000)
+        self.server.writebytes("data", "foo/baz", b"baz")
+        self.server.makedirs("data", "tree/a/b")
+        patcher = mock.patch("fs.smbfs.smbfs.SMBConnection", self.server.connection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.fs = SMBFS(("127.0.0.1", "FAKE"), direct_tcp=True, **self.options)
+        self.addCleanup(self.fs.close)
+        # open the connection of the file pool beforehand
+        self.fs.readbytes("/data/foo/baz")
+
+    @contextlib.contextmanager
+    def assertRequests(self, requests, **calls):
+        self.server.reset()
+        yield
+        self.assertEqual(self.server.requests, requests, self.server.log)
+        for name, count in calls.items():
+            self.assertEqual(self.server.calls[name], count, self.server.log)
+
+    @contextlib.contextmanager
+    def pausedRequest(self, name, function, *args):
+        """Run ``function`` in a thread, pausing its first ``name`` request.
+
+        The body runs after the request was processed by the server, but
+        before its result is returned, and the result of ``function`` is
+        appended to the yielded list once the body is done.
+        """
+        request = getattr(FakeSMBConnection, name)
+        processed, resume = threading.Event(), threading.Event()
+
+        def paused(con, *args, **kwargs):
+            try:
+                return request(con, *args, **kwargs)
+            finally:
+                if not processed.is_set():
+                    processed.set()
+                    resume.wait(5)
+
+        results = []
+        thread = threading.Thread(target=lambda: results.append(function(*args)))
+        with mock.patch.object(FakeSMBConnection, name, paused):
+            thread.start()
+            self.assertTrue(processed.wait(5))
+            try:
+                yield results
+            finally:
+                resume.set()
+                thread.join()
+
+
+class TestBudget(_FakeTestCase):
+
+    def test_getinfo(self):
+        with self.assertRequests(1, getAttributes=1):
+            self.fs.getinfo("/data/foo/bar", ["details"])
+        with self.assertRequests(1, getAttributes=1):
+            self.assertFalse(self.fs.exists("/data/foo/qux"))
+
+    def test_scandir(self):
+        with self.assertRequests(1, listPath=1):
+            names = [info.name for info in self.fs.scandir("/data/foo", ["details"])]
+        self.assertEqual(names, ["bar", "baz"])
+        with self.assertRequests(1, listShares=1):
+            self.assertEqual(self.fs.listdir("/"), ["data", "other"])
+        with self.assertRequests(1, listPath=1):
+            infos = self.fs.filterdir("/data", exclude_files=["*"])
+            self.assertEqual([info.name for info in infos], ["foo", "tree"])
+
+    def test_scandir_access(self):
+        with self.assertRequests(3, listPath=1, getSecurity=2):
+            infos = list(self.fs.scandir("/data/foo", ["access"]))
+        self.assertEqual(infos[0].uid, "S-1-5-21-1-2-3-1000")
+
+    def test_walk(self):
+        with self.assertRequests(5, listPath=5):
+            dirs = list(self.fs.walk.dirs("/data"))
+        self.assertEqual(sorted(dirs), ["/data/foo", "/data/tree", "/data/tree/a", "/data/tree/a/b"])
+
+    def test_openbin_read(self):
+        with self.assertRequests(6, openFile=1, queryFileSize=1, readFile=1, closeFile=1):
+            with self.fs.openbin("/data/foo/bar") as f:
+                self.assertEqual(len(f.read()), 500000)
+
+    def test_openbin_readlines(self):
+        # the read-ahead doubles until the end of the file: 64, 128, 256, 512KiB
+        with self.assertRequests(9, readFile=5):
+            with self.fs.openbin("/data/foo/bar") as f:
+                self.assertEqual(sum(1 for _ in f), 100000)
+
+    def test_openbin_exclusive(self):
+        exists = self.fs.exists
+
+        def exists_then_create(path):
+            # another client creates the file right after the check
+            result = exists(path)
+            self.server.writebytes("data", "foo/qux", b"qux")
+            return result
+
+        with mock.patch.object(self.fs, "exists", side_effect=exists_then_create):
+            self.assertRaises(FileExists, self.fs.openbin, "/data/foo/qux", "x")
+        self.assertEqual(self.server.readbytes("data", "foo/qux"), b"qux")
+
+    def test_openbin_write(self):
+        with self.assertRequests(5, openFile=1, writeFile=1, closeFile=1):
+            with self.fs.openbin("/data/foo/qux", "w") as f:
+                for _ in range(1000):
+                    f.write(b"0123456789")
+        self.assertEqual(self.server.readbytes("data", "foo/qux"), b"0123456789" * 1000)
+
+    def test_bytes(self):
+        with self.assertRequests(2, retrieveFile=1):
+            self.assertEqual(self.fs.readbytes("/data/foo/baz"), b"baz")
+        with self.assertRequests(3, storeFile=1):
+            self.fs.writebytes("/data/foo/qux", b"qux")
+        self.assertEqual(self.server.readbytes("data", "foo/qux"), b"qux")
+
+    def test_upload_smbfile(self):
+        remaining = mock.patch("fs.smbfs.transfer.remaining")
+        with self.fs.openbin("/data/foo/bar") as f, remaining as remaining:
+            with self.assertRequests(8, readFile=2, writeFile=1):
+                self.fs.upload("/other/bar", f)
+        remaining.assert_not_called()
+        self.assertEqual(self.server.readbytes("other", "bar"), b"line\n" * 100000)
+
+    def test_move(self):
+        with self.assertRequests(1, renamePath=1):
+            self.fs.move("/data/foo/baz", "/data/qux")
+        with self.assertRequests(1, renamePath=1):
+            self.fs.movedir("/data/tree", "/data/foo/tree", create=True)
+        self.assertEqual(self.fs.listdir("/data/foo"), ["bar", "tree"])
+
+    def test_copy(self):
+        with self.assertRequests(7, openFile=2, copyFile=1, closeFile=2):
+            self.fs.copy("/data/foo/baz", "/other/baz")
+        self.assertEqual(self.server.readbytes("other", "baz"), b"baz")
+
+    def test_removetree(self):
+        self.server.writebytes("data", "tree/a/b/c", b"c")
+        self.server.writebytes("data", "tree/a/b/d", b"d")
+        with self.assertRequests(7, listPath=3, deleteFiles=1, deleteDirectory=3):
+            self.fs.removetree("/data/tree")
+        self.assertEqual(self.fs.listdir("/data"), ["foo"])
+
+    def test_metrics(self):
+        self.fs.metrics.reset()
+        with self.assertRequests(7):
+            self.fs.readbytes("/data/foo/baz")
+            self.fs.move("/data/foo/baz", "/data/qux")
+            self.fs.listdir("/data")
+            self.fs.writebytes("/data/foo/baz", b"baz")
+        self.assertEqual(self.fs.metrics.requests, 7)
+
+
+class TestBudgetCache(_FakeTestCase):
+
+    options = {"cache_ttl": 60}
+
+    def test_getinfo(self):
+        with self.assertRequests(1, getAttributes=1):
+            self.fs.getinfo("/data/foo/bar")
+            self.fs.getinfo("/data/foo/bar")
+        with self.assertRequests(1, listPath=1):
+            list(self.fs.scandir("/data/foo"))
+            self.fs.getinfo("/data/foo/baz")
+            self.assertTrue(self.fs.isfile("/data/foo/bar"))
+
+    def test_openbin_read(self):
+        with self.assertRequests(4, getAttributes=0):
+            with self.fs.openbin("/data/foo/baz") as f:
+                self.assertEqual(f.read(), b"baz")
+
+    def test_getinfo_access(self):
+        self.server.owners["other"] = 1001
+        with self.assertRequests(5, listShares=1, getAttributes=2, getSecurity=2):
+            shares = list(self.fs.scandir("/", ["access"]))
+        self.assertEqual([info.uid for info in shares], [
+            "S-1-5-21-1-2-3-1000", "S-1-5-21-1-2-3-1001",
+        ])
+        # the descriptors of the shares are cached under their own paths
+        with self.assertRequests(2, getAttributes=2, getSecurity=0):
+            self.assertEqual(self.fs.getinfo("/data", ["access"]).uid, shares[0].uid)
+            self.assertEqual(self.fs.getinfo("/other", ["access"]).uid, shares[1].uid)
+
+    def test_getinfo_invalidated(self):
+        # a lookup racing with a modification does not cache its result
+        exists = self.pausedRequest("getAttributes", self.fs.exists, "/data/foo/x")
+        with exists as results:
+            self.fs.move("/data/foo/baz", "/data/foo/x")
+        self.assertEqual(results, [False])
+        self.assertTrue(self.fs.exists("/data/foo/x"))
+
+    def test_scandir_invalidated(self):
+        listdir = self.pausedRequest("listPath", self.fs.listdir, "/data/foo")
+        with listdir as results:
+            self.fs.remove("/data/foo/baz")
+        self.assertEqual(results, [["bar", "baz"]])
+        self.assertFalse(self.fs.exists("/data/foo/baz"))
+
+
+class TestBudgetSMB1(_FakeTestCase):
+
+    smb2 = False
+
+    def test_openbin_read(self):
+        with self.assertRequests(4, retrieveFileFromOffset=2):
+            with self.fs.openbin("/data/foo/baz") as f:
+                self.assertEqual(f.read(), b"baz")
+
+    def test_move(self):
+        with self.assertRequests(5, rename=1):
+            self.fs.move("/data/foo/baz", "/data/qux")
+
+
+class TestConcurrency(_FakeTestCase):
+
+    latency = 0.01
+    options = {"pool_size": 4, "file_pool_size": 4}
+
+    def test_coalesced(self):
+        barrier = threading.Barrier(8) if hasattr(threading, "Barrier") else None
+        infos = []
+
+        def getinfo():
+            if barrier is not None:
+                barrier.wait()
+            infos.append(self.fs.getinfo("/data/foo/bar"))
+
+        self.server.latency = 0.1
+        threads = [threading.Thread(target=getinfo) for _ in range(8)]
+        with self.assertRequests(1, getAttributes=1):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(infos), 8)
+
+    def test_scandir_access(self):
+        for i in range(16):
+            self.server.writebytes("data", "many/{}".format(i), b"")
+        # the pool grows to 4 connections
+        with self.assertRequests(20, getSecurity=16, connect=3):
+            infos = list(self.fs.scandir("/data/many", ["access"]))
+        self.assertEqual(len(infos), 16)
+        # the security descriptors are fetched over the whole pool
+        self.assertGreater(self.server.peak, 1)
+        self.assertLessEqual(self.server.peak, 4)
+
+    def test_download(self):
+        buffer = io.BytesIO()
+        with self.assertRequests(12, retrieveFileFromOffset=8, connect=3):
+            self.fs.download("/data/foo/bar", buffer, chunk_size=65536)
+        self.assertEqual(buffer.getvalue(), b"line\n" * 100000)
+        # the parts are downloaded over the file pool only
+        self.assertGreater(self.server.peak, 1)
+        self.assertLessEqual(self.server.peak, 4)
+
+
+class TestInvalidation(_FakeTestCase):
+
+    def test_getinfo(self):
+        exists = self.pausedRequest("getAttributes", self.fs.exists, "/data/foo/x")
+        with exists as results:
+            self.fs.move("/data/foo/baz", "/data/foo/x")
+            # the lookup in flight started before the move, and is not joined
+            self.assertTrue(self.fs.exists("/data/foo/x"))
+        self.assertEqual(results, [False])
+
+    def test_scandir(self):
+        listdir = self.pausedRequest("listPath", self.fs.listdir, "/data/foo")
+        with listdir as results:
+            self.fs.remove("/data/foo/baz")
+            self.assertEqual(self.fs.listdir("/data/foo"), ["bar"])
+        self.assertEqual(results, [["bar", "baz"]])
+
+
+class TestInvalidationCache(TestInvalidation):
+
+    options = {"cache_ttl": 60}
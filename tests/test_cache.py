@@ -0,0 +1,83 @@
+# coding: utf-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import time
+import unittest
+
+from fs.smbfs.cache import InfoCache, MISSING
+
+
+class TestInfoCache(unittest.TestCase):
+
+    def test_disabled(self):
+        cache = InfoCache()
+        cache.put("/data/abc", 1)
+        self.assertIs(cache.get("/data/abc"), MISSING)
+
+    def test_get(self):
+        cache = InfoCache(ttl=60)
+        cache.put("/data/abc", 1)
+        cache.put("/data/def", None)
+        self.assertEqual(cache.get("/data/abc"), 1)
+        self.assertEqual(cache.get("data/ABC"), 1)
+        self.assertIs(cache.get("/data/def"), None)
+        self.assertIs(cache.get("/data/ghi"), MISSING)
+
+    def test_ttl(self):
+        cache = InfoCache(ttl=0.01)
+        cache.put("/data/abc", 1)
+        time.sleep(0.02)
+        self.assertIs(cache.get("/data/abc"), MISSING)
+
+    def test_lru(self):
+        cache = InfoCache(ttl=60, maxsize=2)
+        cache.put("/a", 1)
+        cache.put("/b", 2)
+        cache.get("/a")
+        cache.put("/c", 3)
+        self.assertEqual(cache.get("/a"), 1)
+        self.assertIs(cache.get("/b"), MISSING)
+        self.assertEqual(cache.get("/c"), 3)
+
+    def test_invalidate(self):
+        cache = InfoCache(ttl=60)
+        for path in ("/data", "/data/abc", "/data/abc/def", "/data/abcdef"):
+            cache.put(path, 1)
+        cache.invalidate("/data/abc", recursive=True)
+        self.assertEqual(cache.get("/data"), 1)
+        self.assertIs(cache.get("/data/abc"), MISSING)
+        self.assertIs(cache.get("/data/abc/def"), MISSING)
+        self.assertEqual(cache.get("/data/abcdef"), 1)
+
+    def test_generation(self):
+        cache = InfoCache(ttl=60)
+        generation = cache.generation("/data/abc/def")
+        cache.invalidate("/data/abcdef")
+        cache.invalidate("/data/abc")
+        self.assertEqual(cache.generation("/data/abc/def"), generation)
+        cache.invalidate("/data", recursive=True)
+        self.assertGreater(cache.generation("/data/abc/def"), generation)
+        self.assertEqual(cache.generation(), 3)
+
+    def test_put_invalidated(self):
+        cache = InfoCache(ttl=60)
+        generation = cache.generation("/data/abc")
+        cache.invalidate("/data/abc")
+        cache.put("/data/abc", None, generation)
+        self.assertIs(cache.get("/data/abc"), MISSING)
+        cache.put("/data/abc", 1, cache.generation("/data/abc"))
+        self.assertEqual(cache.get("/data/abc"), 1)
+
+    def test_put_cleared(self):
+        cache = InfoCache(ttl=60, maxsize=1)
+        generation = cache.generation()
+        cache.invalidate("/data/abc")
+        cache.invalidate("/data/def")
+        # the invalidation of `/data/abc` was forgotten, but not ignored
+        cache.put("/data/abc", None, generation)
+        self.assertIs(cache.get("/data/abc"), MISSING)
+        generation = cache.generation()
+        cache.clear()
+        cache.put("/data/ghi", None, generation)
+        self.assertIs(cache.get("/data/ghi"), MISSING)
@@ -0,0 +1,140 @@
+# coding: utf-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import struct
+import unittest
+
+from smb.smb2_structs import SMB2IoctlResponse, SMB2Message
+from smb.smb_structs import OperationFailure
+
+from fs.smbfs.connection import (
+    FSCTL_SRV_COPYCHUNK_WRITE,
+    FSCTL_SRV_REQUEST_RESUME_KEY,
+    STATUS_INVALID_PARAMETER,
+    FileHandle,
+    SMBConnection,
+)
+
+from .utils import mock
+
+
+def _reply(status, output):
+    body = struct.pack(
+        SMB2IoctlResponse.STRUCTURE_FORMAT,
+        49, 0, 0, b"\0" * 16, 0, 0,
+        SMB2Message.HEADER_SIZE + SMB2IoctlResponse.STRUCTURE_SIZE, len(output),
+        0, 0,
+    )
+    return mock.Mock(status=status, raw_data=b"\xfeSMB" + b"\0" * 60 + body + output)
+
+
+class _Server(object):
+    """Reply to server-side copy requests like a server with small limits.
+    """
+
+    def __init__(self, limits, size):
+        self.limits = limits
+        self.size = size
+        self.copied = []
+
+    def __call__(self, message, timeout=30):
+        request = message.payload
+        if request.ctlcode == FSCTL_SRV_REQUEST_RESUME_KEY:
+            return _reply(0, b"k" * 24 + b"\0" * 4)
+        self.assert_(request.ctlcode == FSCTL_SRV_COPYCHUNK_WRITE)
+        self.assert_(request.in_data[:24] == b"k" * 24)
+        count = struct.unpack("<I", request.in_data[24:28])[0]
+        chunks = [
+            struct.unpack("<QQII", request.in_data[32 + 24 * i:56 + 24 * i])[:3]
+            for i in range(count)
+        ]
+        max_chunks, max_chunk_size, max_total = self.limits
+        if (
+            count > max_chunks
+            or any(length > max_chunk_size for _, _, length in chunks)
+            or sum(length for _, _, length in chunks) > max_total
+        ):
+            return _reply(STATUS_INVALID_PARAMETER, struct.pack("<III", *self.limits))
+        total = 0
+        for src, dst, length in chunks:
+            self.assert_(src == dst)
+            length = max(0, min(length, self.size - src))
+            self.copied.append((src, length))
+            total += length
+        return _reply(0, struct.pack("<III", count, 0, total))
+
+    def assert_(self, condition):
+        if not condition:
+            raise AssertionError("unexpected request")
+
+
+class TestCopyFile(unittest.TestCase):
+
+    def setUp(self):
+        self.con = SMBConnection("user", "passwd", "client", "server")
+        self.source = FileHandle("share", "a", 1, b"a" * 16, 0)
+        self.target = FileHandle("share", "b", 1, b"b" * 16, 0)
+
+    def test_copy(self):
+        server = _Server((16, 1024 * 1024, 16 * 1024 * 1024), 40 * 1024 * 1024)
+        with mock.patch.object(self.con, "_sendRequest", side_effect=server):
+            copied = self.con.copyFile(self.source, self.target, 40 * 1024 * 1024)
+        self.assertEqual(copied, 40 * 1024 * 1024)
+        self.assertEqual(len(server.copied), 40)
+
+    def test_copy_limits(self):
+        server = _Server((4, 1000, 3000), 10000)
+        with mock.patch.object(self.con, "_sendRequest", side_effect=server) as send:
+            copied = self.con.copyFile(self.source, self.target, 10000)
+        self.assertEqual(copied, 10000)
+        self.assertEqual(sorted(server.copied), [(i * 1000, 1000) for i in range(10)])
+        # resume key, refused request, then 4 requests of at most 3000 bytes
+        self.assertEqual(send.call_count, 6)
+
+    def test_copy_short_source(self):
+        server = _Server((16, 1024, 16 * 1024), 5000)
+        with mock.patch.object(self.con, "_sendRequest", side_effect=server):
+            self.assertEqual(self.con.copyFile(self.source, self.target, 8000), 5000)
+
+    def test_copy_refused(self):
+        with mock.patch.object(self.con, "_sendRequest", return_value=_reply(0xC0000010, b"")):
+            self.assertRaises(
+                OperationFailure, self.con.copyFile, self.source, self.target, 10
+            )
+
+
+class TestRenamePath(unittest.TestCase):
+
+    def setUp(self):
+        self.con = SMBConnection("user", "passwd", "client", "server")
+        self.con.connected_trees["share"] = 1
+        self.sent = []
+
+    def _send(self, message, timeout=30):
+        self.sent.append(message)
+        return mock.Mock(status=0, payload=mock.Mock(fid=b"f" * 16, file_size=0))
+
+    def test_rename(self):
+        with mock.patch.object(self.con, "_sendRequest", side_effect=self._send):
+            self.con.renamePath("share", "a/b", "a/c", replace=True, create_options=1)
+        create, set_info, close = [m.payload for m in self.sent]
+        self.assertEqual(create.filename, "a\\b")
+        self.assertEqual(create.create_options, 1)
+        self.assertEqual(set_info.file_info_class, 0x0A)
+        name = "a\\c".encode("utf-16le")
+        self.assertEqual(set_info.data, b"\1" + b"\0" * 15 + struct.pack("<I", len(name)) + name)
+        self.assertEqual(close.fid, b"f" * 16)
+
+    def test_rename_failed(self):
+        replies = [
+            mock.Mock(status=0, payload=mock.Mock(fid=b"f" * 16, file_size=0)),
+            mock.Mock(status=0xC0000035),
+            mock.Mock(status=0),
+        ]
+        with mock.patch.object(self.con, "_sendRequest", side_effect=replies) as send:
+            with self.assertRaises(OperationFailure) as ctx:
+                self.con.renamePath("share", "a", "b")
+        self.assertEqual(ctx.exception.smb_messages[-1].status, 0xC0000035)
+        # the handle is closed even if the rename failed
+        self.assertEqual(send.call_count, 3)
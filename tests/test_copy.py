@@ -0,0 +1,61 @@
+# coding: utf-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import unittest
+
+import fs.errors
+import fs.memoryfs
+from fs.smbfs.copy import copy_dir, copy_fs
+
+from .utils import mock
+
+
+class TestCopyDir(unittest.TestCase):
+
+    def setUp(self):
+        self.src = fs.memoryfs.MemoryFS()
+        for i in range(3):
+            for j in range(3):
+                self.src.makedirs("a/d{}/e{}/f".format(i, j))
+                self.src.writebytes("a/d{}/e{}/x.txt".format(i, j), b"x" * (i + j))
+        self.src.writebytes("a/y.txt", b"yyy")
+        self.dst = fs.memoryfs.MemoryFS()
+
+    def test_copy_dir(self):
+        progress = []
+        stats = copy_dir(
+            self.src, "a", self.dst, "b", on_progress=lambda s: progress.append(s.files)
+        )
+        self.assertEqual(
+            sorted(self.dst.walk.files("/b")),
+            sorted("/b" + path[2:] for path in self.src.walk.files("/a")),
+        )
+        self.assertEqual(self.dst.readbytes("b/d2/e1/x.txt"), b"xxx")
+        self.assertTrue(self.dst.isdir("b/d0/e0/f"))
+        self.assertEqual((stats.files, stats.total_files), (10, 10))
+        self.assertEqual((stats.bytes, stats.total_bytes), (21, 21))
+        self.assertEqual(stats.directories, 21)
+        self.assertEqual(progress, list(range(1, 11)))
+        self.assertGreaterEqual(stats.throughput, 0)
+
+    def test_copy_fs(self):
+        on_copy = mock.Mock()
+        copy_fs(self.src, self.dst, on_copy=on_copy, workers=2)
+        self.assertEqual(sorted(self.dst.walk.files()), sorted(self.src.walk.files()))
+        on_copy.assert_any_call(self.src, "/a/y.txt", self.dst, "/a/y.txt")
+        self.assertEqual(on_copy.call_count, 10)
+
+    def test_copy_dir_missing_parent(self):
+        # like `fs.copy.copy_dir`, the parent of the destination must exist
+        self.assertRaises(
+            fs.errors.ResourceNotFound, copy_dir, self.src, "a", self.dst, "b/c"
+        )
+        self.assertFalse(self.dst.exists("b"))
+
+    def test_copy_error(self):
+        self.dst.makedirs("b/d1/e1/x.txt")
+        with self.assertRaises(fs.errors.BulkCopyFailed) as ctx:
+            copy_dir(self.src, "a", self.dst, "b")
+        self.assertEqual(len(ctx.exception.errors), 1)
+        self.assertEqual(self.dst.readbytes("b/d2/e2/x.txt"), b"xxxx")
@@ -0,0 +1,55 @@
+# coding: utf-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import threading
+import unittest
+
+from fs.smbfs.flight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_do(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do("a", lambda: 1), 1)
+        self.assertEqual(flight.do("a", lambda: 2), 2)
+        self.assertEqual((flight.calls, flight.coalesced), (2, 0))
+
+    def test_coalesce(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        results = []
+
+        def slow():
+            started.set()
+            release.wait()
+            return object()
+
+        leader = threading.Thread(target=lambda: results.append(flight.do("a", slow)))
+        leader.start()
+        started.wait()
+        followers = [
+            threading.Thread(target=lambda: results.append(flight.do("a", slow)))
+            for _ in range(4)
+        ]
+        for thread in followers:
+            thread.start()
+        while flight.coalesced < 4:
+            threading.Event().wait(0.001)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join()
+
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual((flight.calls, flight.coalesced), (1, 4))
+
+    def test_error(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError("error")
+
+        self.assertRaises(ValueError, flight.do, "a", fail)
+        self.assertEqual(flight.do("a", lambda: 1), 1)
@@ -0,0 +1,94 @@
+# coding: utf-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import io
+import threading
+import unittest
+
+from fs.smbfs.metrics import (
+    CallEvent,
+    InstrumentedConnection,
+    InstrumentedLock,
+    Metrics,
+)
+
+
+class _Connection(object):
+
+    isUsingSMB2 = True
+
+    def retrieveFileFromOffset(self, share, path, file_obj, offset=0, max_length=-1, timeout=30):
+        file_obj.write(b"x" * 10)
+        return 0, 10
+
+    def storeFileFromOffset(self, share, path, file_obj, offset=0, truncate=False, timeout=30):
+        return offset + len(file_obj.read())
+
+    def getAttributes(self, share, path, timeout=30):
+        raise IOError("unreachable")
+
+    def close(self):
+        return "closed"
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics(bounds=(0.1, 1.0))
+
+    def test_record(self):
+        self.metrics.record("echo", 0.05)
+        self.metrics.record("echo", 0.5, error=True)
+        self.metrics.record("echo", 5.0)
+        stats = self.metrics.snapshot()["echo"]
+        self.assertEqual((stats.count, stats.errors), (3, 1))
+        self.assertEqual(stats.buckets, [1, 1, 1])
+        self.assertAlmostEqual(stats.mean, 5.55 / 3)
+        # snapshots are not updated
+        self.metrics.record("echo", 0.05)
+        self.assertEqual(stats.count, 3)
+        self.metrics.reset()
+        self.assertEqual(self.metrics.snapshot(), {})
+
+    def test_callbacks(self):
+        events = []
+        self.metrics.add_callback(events.append)
+        self.metrics.record("readFile", 0.5, bytes_in=10)
+        self.metrics.remove_callback(events.append)
+        self.metrics.record("readFile", 0.5)
+        self.assertEqual(events, [CallEvent("readFile", 0.5, False, 10, 0)])
+
+    def test_capture(self):
+        self.metrics.record("echo", 0.5)
+        with self.metrics.capture() as events:
+            self.metrics.record("listPath", 0.5)
+        self.metrics.record("echo", 0.5)
+        self.assertEqual([event.name for event in events], ["listPath"])
+
+    def test_connection(self):
+        con = InstrumentedConnection(_Connection(), self.metrics)
+        self.assertTrue(con.isUsingSMB2)
+        self.assertEqual(con.close(), "closed")
+        con.retrieveFileFromOffset("share", "a", io.BytesIO(), 0, 10)
+        self.assertEqual(con.storeFileFromOffset("share", "a", io.BytesIO(b"abc"), 5), 8)
+        self.assertRaises(IOError, con.getAttributes, "share", "a")
+        stats = self.metrics.snapshot()
+        self.assertEqual(sorted(stats), ["getAttributes", "retrieveFileFromOffset", "storeFileFromOffset"])
+        self.assertEqual(stats["getAttributes"].errors, 1)
+        self.assertEqual((self.metrics.bytes_in, self.metrics.bytes_out), (10, 3))
+        self.assertEqual(self.metrics.requests, 3)
+
+    def test_lock(self):
+        lock = InstrumentedLock(threading.RLock(), self.metrics)
+        results = []
+        with lock:
+            thread = threading.Thread(target=lambda: results.append(lock.acquire(False)))
+            thread.start()
+            thread.join()
+        self.assertTrue(lock.acquire(False))
+        lock.release()
+        self.assertEqual(results, [False])
+        stats = self.metrics.snapshot()["lock"]
+        self.assertEqual((stats.count, stats.errors), (3, 1))
+        self.assertEqual(self.metrics.requests, 0)
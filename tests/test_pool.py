@@ -0,0 +1,64 @@
+# coding: utf-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import threading
+import time
+import unittest
+
+from fs.smbfs.pool import ConnectionPool
+
+from .utils import mock
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def test_reuse(self):
+        pool = ConnectionPool(mock.MagicMock, maxsize=2)
+        con = pool.acquire()
+        pool.release(con)
+        self.assertIs(pool.acquire(), con)
+
+    def test_block(self):
+        pool = ConnectionPool(mock.MagicMock, maxsize=1)
+        con = pool.acquire()
+        acquired = []
+        thread = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+        thread.start()
+        thread.join(0.1)
+        self.assertEqual(acquired, [])
+        pool.release(con)
+        thread.join()
+        self.assertEqual(acquired, [con])
+
+    def test_no_block(self):
+        pool = ConnectionPool(mock.MagicMock, maxsize=1, block=False)
+        con1, con2 = pool.acquire(), pool.acquire()
+        self.assertIsNot(con1, con2)
+        pool.release(con1)
+        pool.release(con2)
+        con2.close.assert_called_once_with()
+        con1.close.assert_not_called()
+
+    def test_idle_timeout(self):
+        pool = ConnectionPool(mock.MagicMock, maxsize=1, idle_timeout=0.01)
+        con = pool.acquire()
+        pool.release(con)
+        time.sleep(0.02)
+        self.assertIsNot(pool.acquire(), con)
+        con.close.assert_called_once_with()
+
+    def test_connection_error(self):
+        pool = ConnectionPool(mock.MagicMock, maxsize=1)
+        with self.assertRaises(IOError):
+            with pool.connection() as con:
+                raise IOError()
+        con.close.assert_called_once_with()
+        self.assertIsNot(pool.acquire(), con)
+
+    def test_close(self):
+        pool = ConnectionPool(mock.MagicMock, maxsize=1)
+        con = pool.acquire()
+        pool.release(con)
+        pool.close()
+        con.close.assert_called_once_with()
@@ -0,0 +1,235 @@
+# coding: utf-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import unittest
+
+from fs.smbfs import transfer
+
+from .utils import mock
+
+
+class _Connection(object):
+
+    isUsingSMB2 = False
+
+    def __init__(self, files):
+        self.files = files
+
+    def retrieveFileFromOffset(self, share, path, file_obj, offset=0, max_length=-1, timeout=30):
+        data = self.files[(share, path)][offset:]
+        if max_length >= 0:
+            data = data[:max_length]
+        for i in range(0, len(data), 1000):
+            file_obj.write(data[i:i+1000])
+        return 0, len(data)
+
+    def storeFileFromOffset(self, share, path, file_obj, offset=0, truncate=False, timeout=30):
+        data = file_obj.read()
+        current = b"" if truncate else self.files.get((share, path), b"")
+        current = current.ljust(offset, b"\0")
+        self.files[(share, path)] = current[:offset] + data + current[offset+len(data):]
+        return offset + len(data)
+
+
+class _Pool(object):
+
+    def __init__(self, files):
+        self.files = files
+        self.lock = threading.Lock()
+        self.active = self.peak = self.acquired = 0
+
+    @contextlib.contextmanager
+    def connection(self):
+        with self.lock:
+            self.acquired += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            yield _Connection(self.files)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class _Unseekable(object):
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def getvalue(self):
+        return b"".join(self.chunks)
+
+
+class TestDownload(unittest.TestCase):
+
+    def setUp(self):
+        self.data = os.urandom(100000)
+        self.pool = _Pool({("share", "file"): self.data})
+
+    def test_seekable(self):
+        target = io.BytesIO(b"head")
+        target.seek(4)
+        n = transfer.download(self.pool, "share", "file", target, len(self.data), 8192, 4)
+        self.assertEqual(n, len(self.data))
+        self.assertEqual(target.getvalue(), b"head" + self.data)
+        self.assertEqual(target.tell(), 4 + len(self.data))
+        self.assertEqual(self.pool.acquired, 13)
+
+    def test_append(self):
+        with tempfile.NamedTemporaryFile() as tmp:
+            tmp.write(b"head")
+            tmp.flush()
+            with io.open(tmp.name, "ab") as target:
+                n = transfer.download(
+                    self.pool, "share", "file", target, len(self.data), 8192, 4
+                )
+            self.assertEqual(n, len(self.data))
+            with io.open(tmp.name, "rb") as result:
+                self.assertEqual(result.read(), b"head" + self.data)
+
+    def test_file_like(self):
+        with mock.patch.object(transfer, "_PositionalWriter") as writer:
+            target = _Unseekable()
+            target.seek = target.tell = lambda *args: 0
+            transfer.download(self.pool, "share", "file", target, len(self.data), 8192)
+            self.assertEqual(target.getvalue(), self.data)
+            writer.assert_not_called()
+
+    def test_unseekable(self):
+        target = _Unseekable()
+        n = transfer.download(self.pool, "share", "file", target, len(self.data), 8192, 4, 2)
+        self.assertEqual(n, len(self.data))
+        self.assertEqual(target.getvalue(), self.data)
+        self.assertLessEqual(self.pool.peak, 2)
+
+    def test_grown(self):
+        target = io.BytesIO()
+        transfer.download(self.pool, "share", "file", target, 50000, 8192, 4)
+        self.assertEqual(target.getvalue(), self.data)
+
+    def test_empty(self):
+        self.pool.files[("share", "file")] = b""
+        target = io.BytesIO()
+        self.assertEqual(transfer.download(self.pool, "share", "file", target, 0), 0)
+        self.assertEqual(target.getvalue(), b"")
+
+    def test_error(self):
+        target = io.BytesIO()
+        self.assertRaises(
+            KeyError, transfer.download, self.pool, "share", "missing", target, 50000, 8192
+        )
+
+
+class TestUpload(unittest.TestCase):
+
+    def setUp(self):
+        self.data = os.urandom(100000)
+        self.pool = _Pool({("share", "file"): b"x" * 200000})
+
+    def test_remaining(self):
+        source = io.BytesIO(self.data)
+        source.seek(1000)
+        self.assertEqual(transfer.remaining(source), len(self.data) - 1000)
+        self.assertEqual(source.tell(), 1000)
+        self.assertIs(transfer.remaining(_Unseekable()), None)
+
+    def test_upload(self):
+        source = io.BytesIO(b"head" + self.data + b"tail")
+        source.seek(4)
+        size = len(self.data)
+        n = transfer.upload(self.pool, "share", "file", source, size, 8192, 4)
+        self.assertEqual(n, size)
+        self.assertEqual(source.tell(), 4 + size)
+        self.assertEqual(self.pool.files[("share", "file")], self.data)
+        self.assertEqual(self.pool.acquired, 14)
+        self.assertLessEqual(self.pool.peak, 4)
+
+    def test_short_reads(self):
+        source = _ShortReader(self.data)
+        n = transfer.upload(self.pool, "share", "file", source, len(self.data), 8192, 4)
+        self.assertEqual(n, len(self.data))
+        self.assertEqual(self.pool.files[("share", "file")], self.data)
+
+    def test_truncated(self):
+        source = io.BytesIO(self.data[:50000])
+        self.assertRaises(
+            IOError, transfer.upload, self.pool, "share", "file", source, 100000, 8192
+        )
+
+
+class _ShortReader(io.RawIOBase):
+
+    def __init__(self, data):
+        self.file = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self.file.seek(offset, whence)
+
+    def tell(self):
+        return self.file.tell()
+
+    def readinto(self, buffer):
+        data = self.file.read(min(len(buffer), 1000))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class _Reader(object):
+
+    def __init__(self, data, fail_at=None):
+        self.file = io.BytesIO(data)
+        self.fail_at = fail_at
+
+    def read(self, size=-1):
+        if self.fail_at is not None and self.file.tell() >= self.fail_at:
+            raise IOError("read failed")
+        return self.file.read(size)
+
+
+class TestPipe(unittest.TestCase):
+
+    def setUp(self):
+        self.data = os.urandom(100000)
+        self.pool = _Pool({("share", "file"): b"x" * 200000})
+
+    def test_pipe(self):
+        n = transfer.pipe(_Reader(self.data), self.pool, "share", "file", 8192)
+        self.assertEqual(n, len(self.data))
+        self.assertEqual(self.pool.files[("share", "file")], self.data)
+        self.assertEqual(self.pool.acquired, 1)
+
+    def test_empty(self):
+        self.assertEqual(transfer.pipe(_Reader(b""), self.pool, "share", "file"), 0)
+        self.assertEqual(self.pool.files[("share", "file")], b"")
+
+    def test_read_error(self):
+        source = _Reader(self.data, fail_at=50000)
+        self.assertRaises(IOError, transfer.pipe, source, self.pool, "share", "file", 8192)
+
+    def test_write_error(self):
+        source = _Reader(self.data)
+        store = mock.patch.object(
+            _Connection, "storeFileFromOffset", side_effect=[0, 1000, ValueError]
+        )
+        with store:
+            self.assertRaises(
+                ValueError, transfer.pipe, source, self.pool, "share", "file", 1000, 1
+            )
+        # the reader stopped shortly after the writer failed
+        self.assertLess(source.file.tell(), len(self.data))
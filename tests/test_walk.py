@@ -0,0 +1,105 @@
+# coding: utf-8
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import unittest
+
+import fs.memoryfs
+from fs.glob import Globber
+from fs.walk import Walker
+from fs.smbfs.walk import SMBGlobber, SMBWalker
+
+from .utils import mock
+
+
+class TestSMBWalker(unittest.TestCase):
+
+    def setUp(self):
+        self.fs = fs.memoryfs.MemoryFS()
+        for i in range(5):
+            for j in range(5):
+                self.fs.makedirs("d{}/e{}/f".format(i, j))
+                self.fs.touch("d{}/e{}/x.txt".format(i, j))
+                self.fs.touch("d{}/e{}/f/y.py".format(i, j))
+
+    def assertSameWalk(self, **kwargs):
+        for search in ("breadth", "depth"):
+            for max_queued in (1, 256):
+                expected = list(Walker(search=search, **kwargs).walk(self.fs))
+                walker = SMBWalker(workers=4, max_queued=max_queued, search=search, **kwargs)
+                self.assertEqual(list(walker.walk(self.fs)), expected)
+
+    def test_walk(self):
+        self.assertSameWalk()
+
+    def test_walk_filter(self):
+        self.assertSameWalk(filter=["*.py"], exclude_dirs=["e1"])
+
+    def test_walk_max_depth(self):
+        self.assertSameWalk(max_depth=2)
+
+    def test_bind(self):
+        self.assertIs(SMBWalker.bind(self.fs).walker_class, SMBWalker)
+
+    def test_walk_error(self):
+        walker = SMBWalker(workers=4)
+        self.assertRaises(fs.errors.ResourceNotFound, list, walker.walk(self.fs, "/z"))
+        walker = SMBWalker(workers=4, ignore_errors=True)
+        self.assertEqual(list(walker.files(self.fs, "/z")), [])
+
+    def test_walk_patterns(self):
+        walker = SMBWalker(workers=4, patterns=["d1", "e*", "*.txt"])
+        self.assertEqual(
+            list(walker.files(self.fs)),
+            ["/d1/e{}/x.txt".format(i) for i in range(5)],
+        )
+
+    def test_max_queued(self):
+        self.assertRaises(ValueError, SMBWalker, max_queued=0)
+
+
+class TestSMBGlobber(unittest.TestCase):
+
+    def setUp(self):
+        self.fs = fs.memoryfs.MemoryFS()
+        for i in range(3):
+            self.fs.makedirs("d{}/e/f".format(i))
+            self.fs.touch("d{}/e/x.txt".format(i))
+            self.fs.touch("d{}/e/f/y.py".format(i))
+
+    def test_glob(self):
+        for pattern in ("*", "d1/*", "d*/e/*.txt", "d?/**/*.py", "**/", "*/e/"):
+            expected = sorted(m.path for m in Globber(self.fs, pattern))
+            actual = sorted(m.path for m in SMBGlobber(self.fs, pattern))
+            self.assertEqual(actual, expected)
+
+    def test_glob_patterns(self):
+        self.fs.walker_class = SMBWalker
+        for pattern in ("*", "d1/*", "d*/e/*.txt", "d?/**/*.py", "**/", "*/e/"):
+            expected = sorted(m.path for m in Globber(self.fs, pattern))
+            actual = sorted(m.path for m in SMBGlobber(self.fs, pattern))
+            self.assertEqual(actual, expected)
+
+    def test_glob_fallback(self):
+        self.fs.walker_class = SMBWalker
+        # the private helpers of `fs.glob` are missing in this version of `fs`
+        with mock.patch("fs.smbfs.walk._translate_glob", None):
+            for pattern in ("*", "d1/*", "d*/e/*.txt", "d?/**/*.py", "**/"):
+                expected = sorted(Globber(self.fs, pattern))
+                actual = sorted(SMBGlobber(self.fs, pattern))
+                self.assertEqual(actual, expected)
+
+    def test_glob_options(self):
+        self.fs.walker_class = SMBWalker
+        self.fs.touch("d1/e/X.TXT")
+        options = [
+            {"case_sensitive": False},
+            {"exclude_dirs": ["f"]},
+            {"path": "/d1"},
+            {"namespaces": ["details"]},
+        ]
+        for kwargs in options:
+            for pattern in ("*", "D1/*", "d*/e/*.txt", "**/*.py", "**/", "e/*"):
+                expected = sorted(Globber(self.fs, pattern, **kwargs))
+                actual = sorted(SMBGlobber(self.fs, pattern, **kwargs))
+                self.assertEqual(actual, expected)